@@ -1,14 +1,32 @@
 """
 五子棋人机对战游戏
 这是一个使用Python的Pygame库实现的五子棋游戏，包含简单的人工智能对手。
-主要功能包括：图形化界面、玩家与AI对战、胜负判断、弹窗提示等。
+主要功能包括：图形化界面、玩家与AI对战、胜负判断、结果提示等。
 """
 
+import time
+
+# 程序开始运行的时间点，用来统计窗口显示出来、AI准备好各用了多久（包括导入pygame的时间）
+START_TIME = time.perf_counter()
+
 import pygame
 import sys
-import time
+import os
+import json
+import math
+import mmap
+import struct
+import queue
+import random
+import argparse
 import threading
-from tkinter import Tk, messagebox
+from functools import partial
+
+# NumPy是可选依赖：安装了就可以使用向量化的NumpyAI，没有安装时退回纯Python的AI
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # ==================== 游戏常量定义 ====================
 # 这些常量定义了游戏的基本参数，修改它们可以调整游戏的外观和行为
@@ -30,6 +48,21 @@ TOTAL_WIN_PATTERNS = 4 * (BOARD_SIZE - 4) * (BOARD_SIZE - 2)
 # 网格间距（每个格子的大小）
 GAP = WINDOW_SIZE // BOARD_SIZE
 
+# AI工作线程算好落子后发出的事件：主循环没有事件时阻塞等待，靠它唤醒
+AI_MOVE_EVENT = pygame.USEREVENT + 1
+
+# 一局结束时发出的事件，event.winner 是获胜方颜色（1或2），平局为0；event.game_id 是对局编号
+GAME_OVER_EVENT = pygame.USEREVENT + 2
+
+# 后台线程创建好AI对象时发出的事件，event.ai 是AI对象，event.game_id 是对局编号
+AI_READY_EVENT = pygame.USEREVENT + 3
+
+# 对局结果提示使用的字体（按顺序找第一个系统里有的，都没有时用pygame的默认字体）
+RESULT_FONT = "SimHei,Microsoft YaHei,PingFang SC,Noto Sans CJK SC,WenQuanYi Micro Hei"
+
+# 预判模式：玩家思考时，AI最多预先计算玩家最可能的几种应对
+PONDER_REPLIES = 6
+
 # 棋盘上的五个星位点（传统五子棋的标准位置）
 # 坐标从0开始，对应棋盘上的交叉点
 POINTS = [(2, 2), (2, 12), (7, 7), (12, 2), (12, 12)]
@@ -42,68 +75,988 @@ COLORS = {
     "white_stone": (255, 255, 255), # 白棋颜色
 }
 
-# ==================== 全局变量 ====================
-# 注意：实际项目中应尽量避免使用全局变量，这里为了简化而使用
-# 线程锁：用于多线程同步，防止多个线程同时访问共享资源
-lock = threading.Lock()
+# ==================== 获胜模式索引 ====================
+# 每个位置最多属于20个获胜模式（4个方向 × 每个方向最多5个），
+# 所以只记录"位置 → 获胜模式编号列表"的稀疏索引，而不是
+# BOARD_SIZE × BOARD_SIZE × TOTAL_WIN_PATTERNS 的布尔数组
+
+def add_win_pattern(cell_patterns, pattern_cells, start_i, start_j, di, dj):
+    """
+    添加一个获胜模式到索引中
+    
+    参数:
+        cell_patterns: 位置 → 获胜模式编号列表的索引
+        pattern_cells: 获胜模式编号 → 位置列表的索引
+        start_i: 起始行
+        start_j: 起始列
+        di: 行方向增量
+        dj: 列方向增量（与di配合定义方向）
+    """
+    # 新模式的编号就是当前已记录的获胜模式数量
+    pattern_id = len(pattern_cells)
+    
+    # 一个获胜模式包含连续的5个位置
+    cells = [(start_i + k * di, start_j + k * dj) for k in range(5)]
+    
+    # 把模式编号记到这5个位置上
+    for x, y in cells:
+        cell_patterns[x][y].append(pattern_id)
+    pattern_cells.append(cells)
+
+def init_win_patterns():
+    """
+    初始化所有可能的获胜模式（所有可能的五子连珠位置）
+    
+    返回:
+        (cell_patterns, pattern_cells):
+            cell_patterns[x][y] 是包含位置(x,y)的获胜模式编号列表
+            pattern_cells[k] 是第k个获胜模式包含的5个位置
+    """
+    cell_patterns = [[[] for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+    pattern_cells = []
+
+    # 横向和纵向的所有赢法
+    for i in range(1, BOARD_SIZE):
+        for j in range(1, BOARD_SIZE - 4):
+            # 水平方向的获胜模式
+            add_win_pattern(cell_patterns, pattern_cells, i, j, 0, 1)
+            # 垂直方向的获胜模式
+            add_win_pattern(cell_patterns, pattern_cells, j, i, 1, 0)
+    
+    # 对角线方向的所有赢法
+    for i in range(1, BOARD_SIZE - 4):
+        for j in range(1, BOARD_SIZE - 4):
+            # 右下对角线获胜模式
+            add_win_pattern(cell_patterns, pattern_cells, i, j, 1, 1)
+            # 左下对角线获胜模式
+            add_win_pattern(cell_patterns, pattern_cells, i, BOARD_SIZE - j, 1, -1)
+
+    return cell_patterns, pattern_cells
+
+def freeze_table(table):
+    """
+    把嵌套的列表转换成嵌套的元组
+    
+    模块级的索引表被所有AI对象共享，转换成元组后不会被某个对象意外改动
+    
+    参数:
+        table: 嵌套的列表（最内层可以是元组或数字）
+    
+    返回:
+        结构相同的嵌套元组
+    """
+    if isinstance(table, list):
+        return tuple(freeze_table(item) for item in table)
+    return table
+
+# 在导入时只构建一次（约0.5毫秒），所有AI对象共享（只读）
+CELL_WIN_PATTERNS, WIN_PATTERN_CELLS = map(freeze_table, init_win_patterns())
+
+# 候选落子点：与已有棋子的距离（横、竖、斜向都算）不超过这个值的空位
+CANDIDATE_DISTANCE = 2
+
+def init_neighborhoods(distance=CANDIDATE_DISTANCE):
+    """
+    计算每个位置周围distance格以内的位置（不含它自己）
+    
+    返回:
+        neighborhoods[x][y] 是(x,y)周围的位置列表，只包含棋盘内的位置
+    """
+    neighborhoods = [[[] for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+    for x in range(1, BOARD_SIZE):
+        for y in range(1, BOARD_SIZE):
+            for i in range(max(1, x - distance), min(BOARD_SIZE, x + distance + 1)):
+                for j in range(max(1, y - distance), min(BOARD_SIZE, y + distance + 1)):
+                    if (i, j) != (x, y):
+                        neighborhoods[x][y].append((i, j))
+    return neighborhoods
+
+CELL_NEIGHBORHOODS = freeze_table(init_neighborhoods())
+
+# ==================== 位棋盘 ====================
+# 用一个Python整数表示一种颜色的所有棋子：位置(x,y)对应第 (x-1)*BIT_STRIDE + (y-1) 位
+# 每行只用15位，第16位始终为空，作为"隔离列"防止移位时从一行末尾串到下一行开头
+BIT_STRIDE = BOARD_SIZE
+
+# 四个方向对应的移位量：(行增量, 列增量) → 位编号增量
+BIT_SHIFTS = tuple(dx * BIT_STRIDE + dy for dx, dy in ((1, 0), (0, 1), (1, 1), (1, -1)))
+
+def init_five_start_masks():
+    """
+    预先计算每个位置在每个方向上"可能包含它的五连珠起点"掩码
+    
+    返回:
+        masks: masks[d][bit] 是方向d上，从这些位出发的五连珠会经过第bit位
+    """
+    total_bits = (BOARD_SIZE - 1) * BIT_STRIDE
+    masks = []
+    for shift in BIT_SHIFTS:
+        direction_masks = []
+        for bit in range(total_bits):
+            mask = 0
+            for k in range(5):
+                start = bit - k * shift
+                if start >= 0:
+                    mask |= 1 << start
+            direction_masks.append(mask)
+        masks.append(direction_masks)
+    return masks
+
+FIVE_START_MASKS = freeze_table(init_five_start_masks())
+
+# 裁判的连子长度表的行宽：比棋盘多一格，使第0格和第BOARD_SIZE格都能作为边界读取
+RUN_STRIDE = BOARD_SIZE + 1
+
+# 4个方向（竖、横、两个斜向）在连子长度表里的下标偏移
+RUN_OFFSETS = tuple(dx * RUN_STRIDE + dy for dx, dy in ((1, 0), (0, 1), (1, 1), (1, -1)))
+
+# ==================== Zobrist哈希 ====================
+# 给每个位置上的每种颜色分配一个64位随机数，局面的哈希值就是所有棋子随机数的异或
+# 落子或悔棋时只需异或一次，就能增量更新哈希值；固定随机种子保证每次运行结果一致
+
+def init_zobrist_keys(seed=20240601):
+    """
+    生成Zobrist随机数表
+    
+    返回:
+        keys: keys[color][x][y] 是color颜色的棋子在(x,y)上对应的64位随机数
+    """
+    rng = random.Random(seed)
+    return [[[rng.getrandbits(64) for _ in range(BOARD_SIZE)]
+             for _ in range(BOARD_SIZE)]
+            for _ in range(3)]
+
+ZOBRIST_KEYS = freeze_table(init_zobrist_keys())
+
+# 轮到黑棋下时额外异或的随机数，使"同样的棋子、不同的下棋方"得到不同的哈希值
+ZOBRIST_BLACK_TO_MOVE = random.Random(20240602).getrandbits(64)
+
+# ==================== 棋形表 ====================
+# 把一个位置在某个方向上前后各4格（共9格）的棋子编码成一个整数，
+# 预先算好每种编码对应的棋形（活四、冲四、活三……），评估时查表即可。
+# 每格用2位表示：0=空，1=黑棋，2=白棋，3=棋盘外；中间的格子就是要评估的位置，
+# 不参与编码，所以一个方向的编码是8格 × 2位 = 16位
+
+# 棋形编号，数值越大越强
+SHAPE_NONE = 0        # 这个方向已经不可能连成五子
+SHAPE_ONE = 1         # 还能连成五子，但只有这一子
+SHAPE_TWO = 2         # 眠二：再下一子成眠三
+SHAPE_OPEN_TWO = 3    # 活二：再下一子成活三
+SHAPE_THREE = 4       # 眠三：再下一子成冲四
+SHAPE_OPEN_THREE = 5  # 活三：再下一子成活四
+SHAPE_FOUR = 6        # 冲四：只有一个成五点
+SHAPE_OPEN_FOUR = 7   # 活四：有两个以上成五点，对方堵不住
+SHAPE_FIVE = 8        # 五子连珠
+
+# 每种棋形的得分，下标是棋形编号
+SHAPE_SCORES = (0, 10, 30, 100, 150, 1000, 1500, 10000, 100000)
+
+# 棋形表缓存文件，和程序放在同一个目录
+SHAPE_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shape_tables.bin")
+
+# 缓存文件头：魔数、版本号、每个方向的格数。修改了棋形的判断规则或编号时把版本号加1，
+# 旧版本的缓存文件会被自动重新生成
+SHAPE_TABLE_MAGIC = b"GMKSHAPE"
+SHAPE_TABLE_VERSION = 1
+SHAPE_TABLE_HEADER = struct.Struct("<8sII")
+
+# 一个方向的编码包含的位置数（不含中间的格子）
+SHAPE_WINDOW_CELLS = 8
+
+def classify_window(window, cache):
+    """
+    判断一个9格窗口中，中间位置落子之后形成的棋形
+    
+    参数:
+        window: 9个元素的元组，0=空，1=己方，2=对方或棋盘外；window[4]是刚落下的己方棋子
+        cache: 已经判断过的窗口 → 棋形 的字典
+    
+    返回:
+        棋形编号（SHAPE_*）
+    """
+    if window in cache:
+        return cache[window]
+    
+    # 经过中间位置的己方连子长度
+    left = 4
+    while left > 0 and window[left - 1] == 1:
+        left -= 1
+    right = 4
+    while right < 8 and window[right + 1] == 1:
+        right += 1
+    
+    if right - left + 1 >= 5:
+        shape = SHAPE_FIVE
+    elif not any(all(window[i] != 2 for i in range(start, start + 5)) for start in range(5)):
+        # 经过中间位置的5格范围里都有对方棋子，这个方向不可能再连成五子
+        shape = SHAPE_NONE
+    else:
+        # 在每个空位上再落一子，按得到的棋形推出当前的棋形
+        results = [classify_window(window[:i] + (1,) + window[i + 1:], cache)
+                   for i in range(9) if window[i] == 0]
+        
+        fives = results.count(SHAPE_FIVE)
+        if fives >= 2:
+            shape = SHAPE_OPEN_FOUR
+        elif fives == 1:
+            shape = SHAPE_FOUR
+        elif SHAPE_OPEN_FOUR in results:
+            shape = SHAPE_OPEN_THREE
+        elif SHAPE_FOUR in results:
+            shape = SHAPE_THREE
+        elif SHAPE_OPEN_THREE in results:
+            shape = SHAPE_OPEN_TWO
+        elif SHAPE_THREE in results:
+            shape = SHAPE_TWO
+        else:
+            shape = SHAPE_ONE
+    
+    cache[window] = shape
+    return shape
+
+def build_shape_tables():
+    """
+    计算黑白双方的棋形表
+    
+    返回:
+        [None, 黑棋的棋形表, 白棋的棋形表]，每个表是长度 4^8 的bytes，
+        下标是8个位置的2位编码，值是中间位置落下该颜色棋子后的棋形
+    """
+    # 先按"己方/空/对方"三种状态计算，再展开成2位编码
+    cache = {}
+    tables = [None]
+    for color in (1, 2):
+        table = bytearray(4 ** SHAPE_WINDOW_CELLS)
+        for code in range(len(table)):
+            cells = []
+            for i in range(SHAPE_WINDOW_CELLS):
+                value = (code >> (2 * i)) & 3
+                cells.append(0 if value == 0 else (1 if value == color else 2))
+            window = tuple(cells[:4]) + (1,) + tuple(cells[4:])
+            table[code] = classify_window(window, cache)
+        tables.append(bytes(table))
+    return tables
+
+def load_shape_tables(path=SHAPE_TABLE_FILE):
+    """
+    读取棋形表缓存文件，文件不存在、版本不对或大小不对时重新计算并写入
+    
+    参数:
+        path: 缓存文件路径
+    
+    返回:
+        [None, 黑棋的棋形表, 白棋的棋形表]
+    """
+    size = 4 ** SHAPE_WINDOW_CELLS
+    header = SHAPE_TABLE_HEADER.pack(SHAPE_TABLE_MAGIC, SHAPE_TABLE_VERSION, SHAPE_WINDOW_CELLS)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:len(header)] == header and len(data) == len(header) + 2 * size:
+            data = data[len(header):]
+            return [None, data[:size], data[size:]]
+    except OSError:
+        pass
+    
+    tables = build_shape_tables()
+    try:
+        with open(path, "wb") as f:
+            f.write(header + tables[1] + tables[2])
+    except OSError:
+        # 目录不可写时只是下次还要重新计算
+        pass
+    return tables
+
+# 棋形表第一次创建LineCodes时才加载：缓存文件不存在时要重新计算（约0.3秒），
+# 放到后台线程里做，游戏窗口不用等它
+SHAPE_TABLES = None
+SHAPE_TABLES_LOCK = threading.Lock()
+
+def ensure_shape_tables():
+    """
+    加载棋形表（只在第一次调用时加载，多个线程同时调用也只加载一次）
+    
+    返回:
+        SHAPE_TABLES
+    """
+    global SHAPE_TABLES
+    if SHAPE_TABLES is None:
+        with SHAPE_TABLES_LOCK:
+            if SHAPE_TABLES is None:
+                SHAPE_TABLES = tuple(load_shape_tables())
+    return SHAPE_TABLES
+
+def init_line_index():
+    """
+    把棋盘划分成4个方向上的所有直线，记录每个位置在直线编码中的位置
+    
+    每条直线两端各补4个"棋盘外"的格子，这样任何位置前后各4格都在编码范围内
+    
+    返回:
+        (cell_lines, line_init):
+            cell_lines[x][y] 是4个 (直线编号, 位移) ，位移是这个位置的9格窗口在直线编码中的起始位
+            line_init[k] 是第k条直线在空棋盘时的编码（只有两端的棋盘外格子）
+    """
+    cell_lines = [[[] for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+    line_init = []
+    for dx, dy in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        for x in range(1, BOARD_SIZE):
+            for y in range(1, BOARD_SIZE):
+                # 只从每条直线的第一个位置开始
+                if 1 <= x - dx < BOARD_SIZE and 1 <= y - dy < BOARD_SIZE:
+                    continue
+                line_id = len(line_init)
+                length = 0
+                while 1 <= x + length * dx < BOARD_SIZE and 1 <= y + length * dy < BOARD_SIZE:
+                    # 第length个位置在编码中的下标是length+4，窗口从它前面4格开始
+                    cell_lines[x + length * dx][y + length * dy].append((line_id, 2 * length))
+                    length += 1
+                code = 0
+                for i in list(range(4)) + list(range(length + 4, length + 8)):
+                    code |= 3 << (2 * i)
+                line_init.append(code)
+    return cell_lines, line_init
+
+CELL_LINES, LINE_INIT_CODES = map(freeze_table, init_line_index())
 
-# 弹窗状态：标记是否已经弹出获胜提示窗口
-show_popup_window = False
+def deep_sizeof(obj, seen=None):
+    """
+    估算一个对象占用的内存（字节），包括它引用的元组、列表、字典里的所有元素
+    
+    参数:
+        obj: 要统计的对象
+        seen: 已经统计过的对象编号，共享的对象（比如小整数、同一个元组）只算一次
+    
+    返回:
+        字节数
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list, set)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    return size
+
+def table_memory_report():
+    """
+    统计导入时构建的只读索引表各自占用的内存
+    
+    返回:
+        [(表名, 字节数), ...]
+    """
+    tables = [
+        ("CELL_WIN_PATTERNS", CELL_WIN_PATTERNS),
+        ("WIN_PATTERN_CELLS", WIN_PATTERN_CELLS),
+        ("CELL_NEIGHBORHOODS", CELL_NEIGHBORHOODS),
+        ("FIVE_START_MASKS", FIVE_START_MASKS),
+        ("ZOBRIST_KEYS", ZOBRIST_KEYS),
+        ("SHAPE_TABLES", ensure_shape_tables()),
+        ("CELL_LINES", CELL_LINES),
+        ("LINE_INIT_CODES", LINE_INIT_CODES),
+    ]
+    return [(name, deep_sizeof(table)) for name, table in tables]
 
-# 获胜者：记录游戏获胜方（玩家或AI）
-winner = None
+class BoardRenderer:
+    """
+    棋盘渲染器
+    
+    棋盘背景（底色、网格线、星位点）按窗口大小预先画到一个Surface上缓存起来，
+    棋子用预先画好的精灵贴上去。落子和悔棋只改动一个格子，
+    present只把这些格子的矩形刷新到屏幕，不再刷新整个窗口。
+    """
+    
+    def __init__(self, window):
+        """
+        初始化渲染器
+        
+        参数:
+            window: pygame的窗口Surface
+        """
+        # 不同窗口大小的背景Surface，改变窗口大小再改回来时不用重画
+        self.backgrounds = {}
+        
+        # 这一帧需要刷新的矩形；为None时刷新整个窗口
+        self.dirty_rects = []
+        
+        # 刷新统计：帧数、整窗刷新的帧数、刷新的矩形数、贴图和刷新的总耗时与最长耗时（秒）
+        self.stats = {"frames": 0, "full_frames": 0, "rects": 0, "total": 0.0, "max": 0.0}
+        # 这一帧到目前为止贴图花的时间
+        self.frame_time = 0.0
+        # 为列表时记录每一帧的耗时（无头模式统计中位数和P95用），平时为None不记录
+        self.frame_log = None
+        
+        # 对局结果提示的字体，第一次显示时才创建
+        self.font = None
+        
+        self.resize(window)
+    
+    def resize(self, window):
+        """
+        窗口大小改变后，重新计算格子大小并准备这个大小的背景和棋子精灵
+        
+        参数:
+            window: 改变大小后的窗口Surface
+        """
+        self.window = window
+        width, height = window.get_size()
+        # 网格间距：窗口的短边分成BOARD_SIZE份；默认窗口大小时就是GAP
+        self.gap = max(1, min(width, height) // BOARD_SIZE)
+        self.stone_radius = max(1, round(STONE_SIZE * self.gap / GAP))
+        
+        if (width, height) not in self.backgrounds:
+            self.backgrounds[(width, height)] = self.render_background(width, height)
+        self.background = self.backgrounds[(width, height)]
+        
+        # 棋子精灵：透明底的圆形，下标和棋子颜色一致
+        size = 2 * self.stone_radius + 1
+        self.stone_sprites = [None]
+        for name in ("black_stone", "white_stone"):
+            sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, COLORS[name], (self.stone_radius, self.stone_radius),
+                               self.stone_radius)
+            self.stone_sprites.append(sprite)
+    
+    def render_background(self, width, height):
+        """
+        画出棋盘背景：底色、网格线和星位点
+        
+        参数:
+            width, height: 窗口大小
+        
+        返回:
+            画好的Surface
+        """
+        gap = self.gap
+        end = gap * (BOARD_SIZE - 1)
+        surface = pygame.Surface((width, height))
+        
+        # 填充背景颜色
+        surface.fill(COLORS["background"])
+        
+        # 绘制棋盘网格线
+        for i in range(BOARD_SIZE):
+            # 绘制水平线：从左到右
+            pygame.draw.line(surface, COLORS["line"],  # 表面, 颜色
+                            (gap, gap * (i + 1)),          # 起点坐标
+                            (end, gap * (i + 1)),          # 终点坐标
+                            1)                             # 线宽（像素）
+            
+            # 绘制垂直线：从上到下
+            pygame.draw.line(surface, COLORS["line"],  # 表面, 颜色
+                            (gap * (i + 1), gap),          # 起点坐标
+                            (gap * (i + 1), end),          # 终点坐标
+                            1)                             # 线宽
+            
+        # 绘制五个星位点（棋盘上的小黑点）
+        for point in POINTS:
+            # 计算星位点的像素坐标
+            # point[0]和point[1]是网格坐标，需要转换为像素坐标
+            # 注意：point坐标是0-based，但棋盘有边框，所以要+1
+            pixel_x = gap * (point[0] + 1)
+            pixel_y = gap * (point[1] + 1)
+            
+            # 绘制小黑点：表面, 颜色, 圆心坐标, 半径
+            pygame.draw.circle(surface, COLORS["line"],
+                              (pixel_x, pixel_y), max(1, round(5 * gap / GAP)))
+        return surface
+    
+    def cell_rect(self, grid_x, grid_y):
+        """位置(grid_x, grid_y)上棋子占据的矩形"""
+        size = 2 * self.stone_radius + 1
+        return pygame.Rect(grid_x * self.gap - self.stone_radius,
+                           grid_y * self.gap - self.stone_radius, size, size)
+    
+    def draw_board(self, stones=()):
+        """
+        整个窗口重画成空棋盘，再画上stones中的棋子（开局、改变窗口大小时使用）
+        
+        参数:
+            stones: [(x, y, color), ...]
+        """
+        start = time.perf_counter()
+        self.window.blit(self.background, (0, 0))
+        for x, y, color in stones:
+            self.window.blit(self.stone_sprites[color], self.cell_rect(x, y))
+        self.dirty_rects = None
+        self.frame_time += time.perf_counter() - start
+    
+    def draw_stone(self, grid_x, grid_y, color):
+        """在位置(grid_x, grid_y)贴上color颜色的棋子精灵"""
+        start = time.perf_counter()
+        rect = self.cell_rect(grid_x, grid_y)
+        self.window.blit(self.stone_sprites[color], rect)
+        if self.dirty_rects is not None:
+            self.dirty_rects.append(rect)
+        self.frame_time += time.perf_counter() - start
+    
+    def clear_stone(self, grid_x, grid_y):
+        """拿走位置(grid_x, grid_y)的棋子：从背景Surface复制这个格子原来的样子（悔棋时使用）"""
+        start = time.perf_counter()
+        rect = self.cell_rect(grid_x, grid_y)
+        self.window.blit(self.background, rect, rect)
+        if self.dirty_rects is not None:
+            self.dirty_rects.append(rect)
+        self.frame_time += time.perf_counter() - start
+    
+    def draw_banner(self, lines):
+        """
+        在窗口中间画一块半透明的提示框，显示几行文字（对局结束时使用）
+        
+        参数:
+            lines: 要显示的文字列表，第一行是结果
+        """
+        if self.font is None:
+            self.font = pygame.font.SysFont(RESULT_FONT, 32)
+        texts = [self.font.render(line, True, COLORS["white_stone"]) for line in lines]
+        padding = self.gap // 2
+        width = max(text.get_width() for text in texts) + 2 * padding
+        height = sum(text.get_height() for text in texts) + 2 * padding
+        
+        banner = pygame.Surface((width, height), pygame.SRCALPHA)
+        banner.fill((0, 0, 0, 160))
+        top = padding
+        for text in texts:
+            banner.blit(text, ((width - text.get_width()) // 2, top))
+            top += text.get_height()
+        
+        rect = banner.get_rect(center=self.window.get_rect().center)
+        self.window.blit(banner, rect)
+        if self.dirty_rects is not None:
+            self.dirty_rects.append(rect)
+    
+    @property
+    def dirty(self):
+        """这一帧是否有需要刷新到屏幕的变化"""
+        return self.dirty_rects is None or bool(self.dirty_rects)
+    
+    def present(self):
+        """把这一帧的变化刷新到屏幕，并记录这一帧贴图和刷新的耗时"""
+        start = time.perf_counter()
+        if self.dirty_rects is None:
+            pygame.display.update()
+            self.stats["full_frames"] += 1
+        else:
+            pygame.display.update(self.dirty_rects)
+            self.stats["rects"] += len(self.dirty_rects)
+        frame_time = self.frame_time + time.perf_counter() - start
+        
+        self.stats["frames"] += 1
+        self.stats["total"] += frame_time
+        self.stats["max"] = max(self.stats["max"], frame_time)
+        if self.frame_log is not None:
+            self.frame_log.append(frame_time)
+        self.dirty_rects = []
+        self.frame_time = 0.0
+    
+    def format_stats(self):
+        """把刷新统计格式化成一行文字"""
+        stats = self.stats
+        frames = max(1, stats["frames"])
+        return (f"刷新 {stats['frames']} 帧（整窗 {stats['full_frames']} 帧，"
+                f"局部矩形 {stats['rects']} 个），每帧贴图和刷新平均 "
+                f"{stats['total'] / frames * 1000:.3f} ms，最长 {stats['max'] * 1000:.3f} ms")
 
 class GomokuGame:
     """游戏主类，负责游戏流程控制和界面显示"""
     
-    def __init__(self):
-        """初始化游戏"""
+    def __init__(self, ai_factory=None, threat_solver=None, opening_book=None, ponder=False):
+        """
+        初始化游戏
+        
+        参数:
+            ai_factory: 创建AI对象的函数（每开始一局调用一次），为None时使用AI
+            threat_solver: AI落子前先查询的威胁空间搜索（ThreatSolver，每次查询时复制一个），
+                           为None时不查询
+            opening_book: AI落子前最先查询的开局库（OpeningBook），为None时不查询
+            ponder: 是否在玩家思考时预先计算AI对玩家可能应对的回应
+        """
+        # 启动耗时（从程序开始运行算起，秒）：导入完模块、第一帧显示出来、AI准备好
+        self.startup_times = {"import": time.perf_counter() - START_TIME}
+        
         pygame.init()  # 初始化Pygame所有模块
         
-        # 创建游戏窗口，大小为WINDOW_SIZE × WINDOW_SIZE
-        self.window = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE))
+        # 创建游戏窗口，大小为WINDOW_SIZE × WINDOW_SIZE，可以拖动改变大小
+        self.window = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE), pygame.RESIZABLE)
+        
+        # 渲染器：画面有变化（落子、悔棋、重画棋盘）时才把变化的部分刷新到屏幕
+        self.renderer = BoardRenderer(self.window)
+        # 主循环每次醒来时刷新了画面还是跳过了刷新，退出时输出
+        self.frame_stats = {"rendered": 0, "skipped": 0}
+        
+        # 鼠标移动和游戏无关，屏蔽后移动鼠标不会唤醒主循环
+        pygame.event.set_blocked(pygame.MOUSEMOTION)
+        
+        self.ai_factory = ai_factory if ai_factory is not None else AI
+        self.threat_solver = threat_solver
+        self.opening_book = opening_book
+        
+        # AI工作线程算好的落子通过这个队列交给主线程：(对局编号, x, y, 控制台说明)
+        self.ai_queue = queue.Queue()
+        
+        # 对局编号：每开始新的一局加1，旧对局的AI结果到达时直接丢弃
+        self.game_id = 0
+        
+        # 预判：玩家思考时在后台线程里用另一个AI对象计算玩家可能的应对
+        # ponder_cache 按玩家应对后局面的Zobrist哈希值保存 (x, y, 控制台说明)
+        self.ponder = ponder
+        self.ponder_thread = None
+        self.ponder_cancel = None
+        self.ponder_cache = {}
+        self.ponder_stats = {"hits": 0, "misses": 0}
+        
+        self.new_game() # 开始第一局
+        
+        # 先把空棋盘显示出来，AI在后台线程里准备
+        self.renderer.present()
+        self.startup_times["first_frame"] = time.perf_counter() - START_TIME
 
-        pygame.display.set_caption("五子棋人机对战") # 设置窗口标题
+    def new_game(self):
+        """开始新的一局：重置棋盘和AI（按R键时也会调用）"""
+        self.game_id += 1
+        self.stop_pondering()
+        self.ponder_cache.clear()
+        
+        # AI对象在后台线程里创建（第一次还要加载棋形表），准备好之前不接受玩家落子
+        pygame.display.set_caption("五子棋人机对战（AI准备中）") # 设置窗口标题
+        self.ai = None
+        threading.Thread(target=self.prepare_ai, args=(self.game_id,), daemon=True).start()
         
-        self.ai = AI() # 创建AI对象
         self.judge = Judge() # 创建裁判对象
         
         # 当前回合的棋子颜色，1=黑棋（玩家先手），2=白棋（AI）
         self.cur_color = 1
-
+        
+        # AI是否正在工作线程里思考（思考期间不接受玩家落子）
+        self.ai_thinking = False
+        
         self.draw_board() # 绘制初始棋盘
+    
+    def prepare_ai(self, game_id):
+        """
+        后台线程：创建AI对象，完成后发出AI_READY_EVENT把它交给主线程
+        
+        参数:
+            game_id: 开始准备时的对局编号
+        """
+        ai = self.ai_factory()
+        pygame.event.post(pygame.event.Event(AI_READY_EVENT, ai=ai, game_id=game_id))
+    
+    def format_startup_times(self):
+        """启动耗时的统计文字"""
+        times = self.startup_times
+        return (f"启动耗时：导入模块 {times['import'] * 1000:.0f} ms，"
+                f"第一帧 {times['first_frame'] * 1000:.0f} ms，"
+                f"AI准备好 {times['ai_ready'] * 1000:.0f} ms")
 
     def main_loop(self):
         """游戏主循环，不断处理事件和更新画面"""
         while True:  # 无限循环，直到游戏退出
-            # 获取所有发生的事件（鼠标点击、窗口关闭等）
-            for event in pygame.event.get():
+            # 没有事件时阻塞在这里，不占用CPU；醒来后把积压的事件一起取出
+            events = [pygame.event.wait()] + pygame.event.get()
+            
+            # 处理AI工作线程送回的落子
+            while not self.ai_queue.empty():
+                game_id, ai_x, ai_y, info = self.ai_queue.get()
+                
+                # 思考期间重新开始了一局，这是旧对局的结果，丢弃
+                if game_id != self.game_id:
+                    continue
+                
+                self.ai_thinking = False
+                pygame.display.set_caption("五子棋人机对战")
+                
+                # 在控制台输出这一步是怎么选出来的（搜索AI还有搜索统计）
+                if info:
+                    print(info)
+                
+                # 处理AI落子，然后趁玩家思考时预判
+                self.make_move(ai_x, ai_y)
+                self.start_pondering()
+            
+            # 处理所有发生的事件（鼠标点击、窗口关闭等）
+            for event in events:
                 # 如果事件是关闭窗口（点击右上角的X）
                 if event.type == pygame.QUIT:
+                    print(f"画面刷新 {self.frame_stats['rendered']} 次，"
+                          f"没有变化跳过 {self.frame_stats['skipped']} 次")
+                    print(self.renderer.format_stats())
                     pygame.quit()  # 关闭Pygame
                     sys.exit()     # 退出程序
                 
-                # 如果事件是鼠标按钮按下（玩家点击落子）
-                elif event.type == pygame.MOUSEBUTTONDOWN:
+                # 后台线程创建好了AI，开始接受玩家落子（重新开始过的旧对局的AI丢弃）
+                elif event.type == AI_READY_EVENT and event.game_id == self.game_id:
+                    self.ai = event.ai
+                    pygame.display.set_caption("五子棋人机对战")
+                    if "ai_ready" not in self.startup_times:
+                        self.startup_times["ai_ready"] = time.perf_counter() - START_TIME
+                        print(self.format_startup_times())
+                
+                # 一局结束，在窗口里显示结果（同一批事件里先处理了悔棋时，这一局已经没有结束）
+                elif event.type == GAME_OVER_EVENT and event.game_id == self.game_id \
+                        and self.judge.winner is not None:
+                    self.show_result(event.winner)
+                
+                # 窗口改变大小后按新的格子大小重画
+                elif event.type == pygame.VIDEORESIZE:
+                    self.window = pygame.display.get_surface()
+                    self.renderer.resize(self.window)
+                    self.draw_board()
+                
+                # 窗口被遮挡后重新露出，需要整窗刷新
+                elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self.renderer.dirty_rects = None
+                
+                # 按R键重新开始
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+                    self.new_game()
+                
+                # 按U键悔棋（AI思考时和AI还没准备好时不响应）
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_u \
+                        and not self.ai_thinking and self.ai is not None:
+                    self.stop_pondering()
+                    self.undo_turn()
+                    self.start_pondering()
+                
+                # 如果事件是鼠标按钮按下（玩家点击落子），AI思考时、AI还没准备好时
+                # 和一局结束后不响应
+                elif event.type == pygame.MOUSEBUTTONDOWN and not self.ai_thinking \
+                        and self.ai is not None and self.judge.winner is None:
                     # 获取鼠标点击的像素坐标
                     x, y = event.pos
                     
                     # 将像素坐标转换为棋盘网格坐标
                     grid_x, grid_y = self.compute_grid_position(x, y)
                     
+                    # 玩家落子前先停下预判，预判用的棋盘和置换表不能和AI同时改动
+                    self.stop_pondering()
+                    
                     # 处理玩家落子，如果成功返回True
                     ret = self.make_move(grid_x, grid_y)
                     
-                    # 如果玩家落子成功，AI进行落子
-                    if ret:
-                        # AI计算最佳落子位置
-                        ai_x, ai_y = self.ai.ai_run(self.judge.board)
-                        
-                        # 处理AI落子
-                        self.make_move(ai_x, ai_y)
+                    # 如果玩家落子成功并且没有分出胜负，让AI在工作线程里开始思考；
+                    # 落子失败时继续预判
+                    if ret and self.judge.winner is None:
+                        self.start_ai_turn()
+                    elif not ret:
+                        self.start_pondering()
             
-            # 更新整个游戏窗口的显示
-            pygame.display.update()
+            # 画面有变化时才更新窗口的显示，只刷新变化的矩形
+            if self.renderer.dirty:
+                self.renderer.present()
+                self.frame_stats["rendered"] += 1
+            else:
+                self.frame_stats["skipped"] += 1
+            
+            self.after_frame()
+    
+    def after_frame(self):
+        """主循环每处理完一批事件、刷新完画面后调用（无头模式在这里输入玩家的下一步）"""
+        pass
+    
+    def post_ai_move(self, game_id, ai_x, ai_y, info):
+        """
+        把AI的落子交给主线程，并发出AI_MOVE_EVENT唤醒主循环（可以在工作线程里调用）
+        
+        参数:
+            game_id: 开始思考时的对局编号
+            ai_x, ai_y: 落子位置
+            info: 要在控制台输出的说明
+        """
+        self.ai_queue.put((game_id, ai_x, ai_y, info))
+        pygame.event.post(pygame.event.Event(AI_MOVE_EVENT))
+    
+    def show_result(self, color):
+        """
+        在窗口中间显示对局结果（收到GAME_OVER_EVENT时调用）
+        
+        参数:
+            color: 获胜方颜色，1=玩家，2=AI，0=平局
+        """
+        if color:
+            msg = f"{'玩家 (黑色)' if color == 1 else 'AI (白色)'} 获胜!"
+        else:
+            msg = "平局！"
+        pygame.display.set_caption(f"五子棋人机对战 - {msg}")
+        self.renderer.draw_banner([msg, "按R键重新开始，按U键悔棋"])
+    
+    def start_ai_turn(self):
+        """启动AI工作线程计算落子，主循环继续刷新画面和处理事件"""
+        self.ai_thinking = True
+        
+        # 预判过这个局面时直接落子，不用再启动工作线程
+        if self.ponder:
+            cached = self.ponder_cache.get(self.ai.zobrist_hash)
+            if cached is not None:
+                self.ponder_stats["hits"] += 1
+                ai_x, ai_y, info = cached
+                info = f"预判命中（累计命中 {self.ponder_stats['hits']} / " \
+                       f"未命中 {self.ponder_stats['misses']}）" + (f"，{info}" if info else "")
+                self.post_ai_move(self.game_id, ai_x, ai_y, info)
+                return
+            self.ponder_stats["misses"] += 1
+        
+        pygame.display.set_caption("五子棋人机对战 - AI思考中...")
+        threading.Thread(target=self.ai_worker,
+                         args=(self.game_id, self.ai, self.judge.board),
+                         daemon=True).start()
+    
+    def choose_ai_move(self, ai, board, cancel=None):
+        """
+        按开局库、威胁空间搜索、AI评估的顺序选出AI（白棋）的落子
+        
+        参数:
+            ai: 计算落子用的AI对象（搜索AI被取消时抛出SearchTimeout）
+            board: 和AI对象局面一致的棋盘
+            cancel: 预判的取消标志，设置后威胁空间搜索尽快放弃，为None时不检查
+        
+        返回:
+            (x, y, info): 落子位置和要在控制台输出的说明（没有时为None）
+        """
+        # 开局先查开局库
+        move = self.opening_book.lookup(board, 2) if self.opening_book else None
+        if move:
+            return move[0], move[1], "开局库命中"
+        
+        # 再用威胁空间搜索找必胜的连续进攻，找不到时再按AI的评估落子。
+        # 旧对局的AI线程、预判线程可能同时在求解，每次都用一个新的求解器。
+        # AI限制了思考时间时，求解最多用一半，剩下的时间留给AI搜索
+        budget = getattr(ai, "time_budget_ms", None)
+        solver = self.threat_solver.copy() if self.threat_solver else None
+        move = None
+        if solver:
+            move = solver.solve(board, 2, cancel, budget / 2 if budget is not None else None)
+            if move:
+                stats = solver.stats
+                return move[0], move[1], (f"{stats['kind']} 必胜，节点 {stats['nodes']}，"
+                                          f"耗时 {stats['time_ms']:.1f} ms")
+            if budget is not None:
+                budget -= solver.stats["time_ms"]
+        
+        if budget is not None:
+            ai_x, ai_y = ai.ai_run(board, time_budget_ms=budget)
+        else:
+            ai_x, ai_y = ai.ai_run(board)
+        # 搜索AI输出这一步的搜索统计
+        info = ai.format_search_stats() if isinstance(ai, SearchAI) else None
+        return ai_x, ai_y, info
+    
+    def ai_worker(self, game_id, ai, board):
+        """
+        AI工作线程：计算最佳落子位置，把结果放进队列
+        
+        参数:
+            game_id: 开始思考时的对局编号
+            ai: 这一局的AI对象
+            board: 这一局的棋盘
+        """
+        ai_x, ai_y, info = self.choose_ai_move(ai, board)
+        self.post_ai_move(game_id, ai_x, ai_y, info)
+    
+    def start_pondering(self):
+        """
+        轮到玩家时启动预判线程
+        
+        预判用一个新建的AI对象摆出当前局面，不会改动这一局的AI和棋盘；
+        搜索AI和这一局的AI共用置换表，预判没算完的局面也能让正式搜索更快。
+        多进程的并行搜索AI共用进程池，不做预判。
+        """
+        if not self.ponder or self.cur_color != 1 or isinstance(self.ai, ParallelSearchAI):
+            return
+        # 对局已经结束
+        if self.judge.is_full() or (self.judge.history and self.judge.history[-1][3]):
+            return
+        
+        stones = self.ai.bitboard.stones
+        ponder_ai = self.ai_factory()
+        ponder_ai.load_stones(stones[1], stones[2])
+        self.ponder_cancel = threading.Event()
+        if isinstance(ponder_ai, SearchAI):
+            ponder_ai.tt = self.ai.tt
+            ponder_ai.cancel = self.ponder_cancel
+        
+        # 按玩家的角度给候选点打分（玩家的得分算进攻），取最可能的几种应对
+        replies = sorted(ponder_ai.candidate_cells(), reverse=True,
+                         key=lambda cell: ponder_ai.evaluate_position(
+                             ponder_ai.ai_scores[cell[0]][cell[1]],
+                             ponder_ai.human_scores[cell[0]][cell[1]]))
+        
+        self.ponder_thread = threading.Thread(
+            target=self.ponder_worker,
+            args=(ponder_ai, [row[:] for row in self.judge.board],
+                  replies[:PONDER_REPLIES], self.ponder_cancel),
+            daemon=True)
+        self.ponder_thread.start()
+    
+    def ponder_worker(self, ai, board, replies, cancel):
+        """
+        预判线程：依次假设玩家下在replies中的位置，计算AI的回应并放进缓存
+        
+        参数:
+            ai: 预判专用的AI对象
+            board: 当前棋盘的副本
+            replies: 玩家最可能的应对，按可能性从大到小排列
+            cancel: 设置后尽快停止预判
+        """
+        for x, y in replies:
+            if cancel.is_set():
+                break
+            ai.push_move(x, y, 1)
+            board[x][y] = 1
+            key = ai.zobrist_hash
+            stack_size = len(ai.undo_stack)
+            try:
+                # 玩家这一步直接获胜时不需要回应
+                if key not in self.ponder_cache and not ai.bitboard.is_five(x, y, 1):
+                    move = self.choose_ai_move(ai, board, cancel)
+                    if not cancel.is_set():
+                        self.ponder_cache[key] = move
+            except SearchTimeout:
+                # 被取消时搜索在递归中途停下，撤回还没撤回的试走
+                while len(ai.undo_stack) > stack_size:
+                    ai.pop_move()
+            board[x][y] = 0
+            ai.pop_move()
+    
+    def stop_pondering(self):
+        """
+        取消预判并等待预判线程退出
+        
+        威胁空间搜索和alpha-beta搜索每16个节点、MCTS每次模拟前检查一次取消标志，
+        所以很快就会停下
+        """
+        if self.ponder_thread is None:
+            return
+        self.ponder_cancel.set()
+        self.ponder_thread.join()
+        self.ponder_thread = None
+    
+    def undo_turn(self):
+        """悔棋：撤销AI的最后一步和玩家的最后一步，回到玩家落子前的局面"""
+        # 一局已经结束时窗口里有结果提示，悔棋后要整个重画
+        game_over = self.judge.winner is not None
+        undone = 0
+        while self.judge.history:
+            x, y, color, _, _ = self.judge.history[-1]
+            # 已经撤销了玩家的一步，停在玩家的回合
+            if undone and color == 2:
+                break
+            self.judge.pop_move()
+            self.ai.pop_move()
+            # 只把这个格子恢复成棋盘背景，不用重画整个棋盘
+            self.renderer.clear_stone(x, y)
+            undone += 1
+            if color == 1:
+                break
+        if undone:
+            self.cur_color = 1
+        if undone and game_over:
+            pygame.display.set_caption("五子棋人机对战")
+            self.draw_board()
     
     def make_move(self, grid_x, grid_y):
         """
@@ -130,6 +1083,11 @@ class GomokuGame:
                 # 更新AI的获胜模式计数
                 self.ai.update_win_counts(grid_x, grid_y, self.cur_color)
                 
+                # 分出胜负或者下满了，通过事件通知主循环显示结果
+                if self.judge.winner is not None:
+                    pygame.event.post(pygame.event.Event(GAME_OVER_EVENT, winner=self.judge.winner,
+                                                         game_id=self.game_id))
+                
                 # 切换当前回合：黑棋变白棋，白棋变黑棋
                 self.cur_color = 2 if self.cur_color == 1 else 1
                 
@@ -146,10 +1104,8 @@ class GomokuGame:
             grid_y: 网格列坐标
             color: 棋子颜色，1=黑棋，2=白棋
         """
-        # 根据颜色选择棋子颜色
-        stone_color = COLORS["black_stone"] if color == 1 else COLORS["white_stone"]
-        # 绘制圆形棋子
-        pygame.draw.circle(self.window, stone_color, (grid_x * GAP, grid_y * GAP), STONE_SIZE)
+        # 贴上预先画好的棋子精灵，只有这个格子需要刷新
+        self.renderer.draw_stone(grid_x, grid_y, color)
     
     def compute_grid_position(self, x, y):
         """
@@ -163,8 +1119,8 @@ class GomokuGame:
             (grid_x, grid_y): 网格坐标
         """
         # 计算最近的网格坐标：像素坐标 ÷ 网格间距，四舍五入
-        grid_x = round(x / GAP)
-        grid_y = round(y / GAP)
+        grid_x = round(x / self.renderer.gap)
+        grid_y = round(y / self.renderer.gap)
         
         # 确保坐标在有效范围内（1到BOARD_SIZE-1）
         grid_x = max(1, min(BOARD_SIZE - 1, grid_x))
@@ -173,35 +1129,174 @@ class GomokuGame:
         return grid_x, grid_y
     
     def draw_board(self):
-        """绘制棋盘背景、网格线和星位点"""
-        # 填充背景颜色
-        self.window.fill(COLORS["background"])
+        """重画整个棋盘：复制缓存的棋盘背景，再画上这一局已有的棋子"""
+        self.renderer.draw_board([(x, y, color) for x, y, color, _, _ in self.judge.history])
+
+class BitBoard:
+    """
+    位棋盘：每种颜色的棋子用一个Python整数表示
+    
+    判断五连珠只需要几次移位和按位与，复制棋盘也只是复制两个整数，
+    适合搜索时大量复制和比较局面
+    """
+    
+    __slots__ = ("stones",)
+    
+    def __init__(self, stones=None):
+        """
+        初始化位棋盘
         
-        # 绘制棋盘网格线
-        for i in range(BOARD_SIZE):
-            # 绘制水平线：从左到右
-            pygame.draw.line(self.window, COLORS["line"],  # 表面, 颜色
-                            (GAP, GAP * (i + 1)),          # 起点坐标
-                            (WINDOW_SIZE - GAP, GAP * (i + 1)),  # 终点坐标
-                            1)                             # 线宽（像素）
-            
-            # 绘制垂直线：从上到下
-            pygame.draw.line(self.window, COLORS["line"],  # 表面, 颜色
-                            (GAP * (i + 1), GAP),          # 起点坐标
-                            (GAP * (i + 1), WINDOW_SIZE - GAP),  # 终点坐标
-                            1)                             # 线宽
-            
-        # 绘制五个星位点（棋盘上的小黑点）
-        for point in POINTS:
-            # 计算星位点的像素坐标
-            # point[0]和point[1]是网格坐标，需要转换为像素坐标
-            # 注意：point坐标是0-based，但棋盘有边框，所以要+1
-            pixel_x = GAP * (point[0] + 1)
-            pixel_y = GAP * (point[1] + 1)
-            
-            # 绘制小黑点：表面, 颜色, 圆心坐标, 半径
-            pygame.draw.circle(self.window, COLORS["line"], 
-                              (pixel_x, pixel_y), 5)
+        参数:
+            stones: [空, 黑棋位图, 白棋位图]，为None时创建空棋盘
+        """
+        # 下标与棋子颜色一致：stones[1]是黑棋，stones[2]是白棋
+        self.stones = stones if stones is not None else [0, 0, 0]
+    
+    @staticmethod
+    def bit_index(x, y):
+        """位置(x,y)对应的位编号（x和y都在1到BOARD_SIZE-1之间）"""
+        return (x - 1) * BIT_STRIDE + (y - 1)
+    
+    def copy(self):
+        """复制位棋盘"""
+        return BitBoard(self.stones[:])
+    
+    def get(self, x, y):
+        """
+        获取位置(x,y)的棋子颜色
+        
+        返回:
+            0 = 空，1 = 黑棋，2 = 白棋
+        """
+        bit = 1 << self.bit_index(x, y)
+        if self.stones[1] & bit:
+            return 1
+        if self.stones[2] & bit:
+            return 2
+        return 0
+    
+    def place(self, x, y, color):
+        """在位置(x,y)放置一个color颜色的棋子"""
+        self.stones[color] |= 1 << self.bit_index(x, y)
+    
+    def remove(self, x, y, color):
+        """拿走位置(x,y)上color颜色的棋子"""
+        self.stones[color] &= ~(1 << self.bit_index(x, y))
+    
+    def runs(self, color, shift, length):
+        """
+        某个方向上的移位视图：找出color颜色连续length个棋子的所有起点
+        
+        参数:
+            color: 棋子颜色
+            shift: 方向对应的移位量（BIT_SHIFTS中的一个）
+            length: 连续棋子的数量
+        
+        返回:
+            位图，第bit位为1表示从bit开始沿这个方向有连续length个棋子
+        """
+        bits = self.stones[color]
+        result = bits
+        for k in range(1, length):
+            result &= bits >> (k * shift)
+        return result
+    
+    @staticmethod
+    def iter_cells(bits):
+        """
+        按位编号从小到大（即按行优先顺序）遍历位图中的所有位置
+        
+        参数:
+            bits: 位图
+        
+        返回:
+            生成器，依次产生(x, y)
+        """
+        while bits:
+            low = bits & -bits  # 取出最低位的1
+            x, y = divmod(low.bit_length() - 1, BIT_STRIDE)
+            yield x + 1, y + 1
+            bits ^= low
+    
+    def is_five(self, x, y, color):
+        """
+        检查经过位置(x,y)是否有color颜色的五子连珠
+        
+        参数:
+            x: 行坐标
+            y: 列坐标
+            color: 棋子颜色
+        
+        返回:
+            True: 有五子连珠（长连也算）
+            False: 没有
+        """
+        bit = self.bit_index(x, y)
+        for d, shift in enumerate(BIT_SHIFTS):
+            # 有五连珠的起点落在"可能经过(x,y)的起点"范围内，说明这条五连珠经过(x,y)
+            if self.runs(color, shift, 5) & FIVE_START_MASKS[d][bit]:
+                return True
+        return False
+
+class LineCodes:
+    """
+    按直线保存的棋盘编码：每条直线是一个Python整数，每格占2位
+    
+    落子和撤销只改4条直线的编码；评估一个位置时每个方向取出一段16位的编码，
+    查一次棋形表，4次查表就得到这个位置在4个方向上的棋形
+    """
+    
+    __slots__ = ("codes",)
+    
+    # 取出9格窗口中中间位置前后各4格的掩码
+    LOW_MASK = (1 << 8) - 1
+    
+    def __init__(self, codes=None):
+        """
+        参数:
+            codes: 每条直线的编码列表，为None时创建空棋盘
+        """
+        if codes is None:
+            ensure_shape_tables()
+            codes = list(LINE_INIT_CODES)
+        self.codes = codes
+    
+    def copy(self):
+        """复制直线编码"""
+        return LineCodes(self.codes[:])
+    
+    def place(self, x, y, color):
+        """在空位(x,y)上放一个color颜色的棋子"""
+        codes = self.codes
+        for line_id, shift in CELL_LINES[x][y]:
+            codes[line_id] |= color << (shift + 8)
+    
+    def remove(self, x, y, color):
+        """拿掉(x,y)上color颜色的棋子"""
+        codes = self.codes
+        for line_id, shift in CELL_LINES[x][y]:
+            codes[line_id] &= ~(color << (shift + 8))
+    
+    def shapes(self, x, y, color):
+        """
+        在空位(x,y)落下color颜色的棋子后，4个方向上的棋形
+        
+        返回:
+            4个棋形编号（SHAPE_*）的列表
+        """
+        codes = self.codes
+        table = SHAPE_TABLES[color]
+        low_mask = self.LOW_MASK
+        result = []
+        for line_id, shift in CELL_LINES[x][y]:
+            window = codes[line_id] >> shift
+            # 去掉中间位置的2位，前4格在低8位，后4格在高8位
+            result.append(table[(window & low_mask) | ((window >> 10) & 0xFF) << 8])
+        return result
+    
+    def shape_score(self, x, y, color):
+        """在空位(x,y)落下color颜色的棋子后，4个方向棋形得分之和"""
+        return sum(SHAPE_SCORES[shape] for shape in self.shapes(x, y, color))
 
 class Judge:
     """裁判类，负责管理棋盘状态和判断胜负"""
@@ -212,6 +1307,24 @@ class Judge:
         # 棋盘大小：BOARD_SIZE × BOARD_SIZE（第1行和第一列没有使用）
         # 0 = 空，1 = 黑棋（玩家），2 = 白棋（AI）
         self.board = [[0 for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+        
+        # 同一个棋盘的位棋盘表示，用于快速判断胜负
+        self.bitboard = BitBoard()
+        
+        # 棋盘上的棋子数，判断棋盘是否下满时不用再扫描棋盘
+        self.stone_count = 0
+        
+        # 连子长度表：run_lengths[color][d][x * RUN_STRIDE + y] 是方向d上
+        # 经过(x,y)的color色连子长度。只保证每段连子两端的值是准确的，
+        # 落子时读取两侧相邻棋子（一定是连子的端点）的值就能算出新的连子长度
+        size = RUN_STRIDE * RUN_STRIDE
+        self.run_lengths = [None] + [[[0] * size for _ in range(4)] for _ in range(2)]
+        
+        # 落子记录，用于悔棋：(x, y, color, 是否成五, 被修改的连子长度[(d, 下标, 旧值), ...])
+        self.history = []
+        
+        # 对局结果：None=还没结束，0=平局，1或2=获胜方颜色
+        self.winner = None
     
     def update_board(self, x, y, color):
         """
@@ -229,28 +1342,80 @@ class Judge:
 
         # 检查要落子的位置是否为空
         if self.board[x][y] == 0:
-            # 在棋盘上放置棋子
-            self.board[x][y] = color
+            # 在棋盘上放置棋子，同时得到是否成五
+            five = self.push_move(x, y, color)
             
-            # 检查是否获胜（五子连珠）
-            if self.check_win(x, y):
-                # 使用全局变量记录获胜信息
-                global show_popup_window, winner
-                with lock: # 加锁，确保线程安全
-                    show_popup_window = True # 设置弹窗标志
-
-                    # 确定获胜者：1=玩家，2=AI
-                    winner = "玩家 (黑色)" if color == 1 else "AI (白色)"
+            # 检查是否获胜（五子连珠），记录获胜方：1=玩家，2=AI
+            if five:
+                self.winner = color
 
             # 检查是否平局（棋盘满了）
-            if self.is_full():
-                show_popup_window = True
+            elif self.is_full():
+                self.winner = 0
 
             # 返回更新成功
             return True
         # 位置已有棋子，更新失败
         return False
     
+    def push_move(self, x, y, color):
+        """
+        在空位(x,y)落子，更新4个方向的连子长度，并记录到落子记录里（不记录对局结果）
+        
+        (x,y)原来是空位，所以它两侧相邻的同色棋子一定是各自连子的端点，
+        新的连子长度 = 左侧长度 + 1 + 右侧长度，只需要改写新连子的两个端点和(x,y)本身
+        
+        参数:
+            x: 落子的行坐标
+            y: 落子的列坐标
+            color: 棋子颜色
+        
+        返回:
+            True: 落子后形成五子连珠
+            False: 没有形成
+        """
+        self.board[x][y] = color
+        self.bitboard.place(x, y, color)
+        self.stone_count += 1
+        
+        index = x * RUN_STRIDE + y
+        changes = []
+        five = False
+        for d, offset in enumerate(RUN_OFFSETS):
+            runs = self.run_lengths[color][d]
+            before = runs[index - offset]
+            after = runs[index + offset]
+            length = before + 1 + after
+            for cell in (index - before * offset, index + after * offset, index):
+                changes.append((d, cell, runs[cell]))
+                runs[cell] = length
+            if length >= 5:
+                five = True
+        self.history.append((x, y, color, five, changes))
+        return five
+    
+    def pop_move(self):
+        """
+        悔棋：撤销最后一步落子，恢复棋盘、位棋盘和连子长度
+        
+        返回:
+            (x, y, color): 被撤销的落子，没有落子时返回None
+        """
+        if not self.history:
+            return None
+        x, y, color, _, changes = self.history.pop()
+        
+        # 按修改的相反顺序恢复旧值（同一个下标可能被改写过多次）
+        for d, cell, old in reversed(changes):
+            self.run_lengths[color][d][cell] = old
+        
+        self.board[x][y] = 0
+        self.bitboard.remove(x, y, color)
+        self.stone_count -= 1
+        # 撤销之后这一局又没有结束了
+        self.winner = None
+        return x, y, color
+    
     def check_win(self, x, y):
         """
         检查是否五子连珠（获胜条件）
@@ -263,39 +1428,17 @@ class Judge:
             True: 有五子连珠，获胜
             False: 没有五子连珠
         """
-        # 四个检查方向：(行增量, 列增量)
-        directions = [(1, 0),   # 水平方向（右/左）
-                      (0, 1),   # 垂直方向（下/上）
-                      (1, 1),   # 右下/左上对角线
-                      (1, -1)]  # 左下/右上对角线
+        # 最后一步落子在落子时就已经算出了是否成五
+        if self.history and self.history[-1][:2] == (x, y):
+            return self.history[-1][3]
         
         # 获取最后落子的颜色
         cur_color = self.board[x][y]
+        if cur_color == 0:
+            return False
         
-        # 检查每个方向
-        for dx, dy in directions:
-            stone_count = 1  # 从当前棋子开始计数，初始为1
-            
-            # 向两个方向检查：正向和反向
-            for sign in (1, -1):
-                # 从当前位置向指定方向移动一步
-                cur_x, cur_y = x + dx * sign, y + dy * sign
-                
-                # 沿着这个方向连续检查相同颜色的棋子
-                while (0 < cur_x < BOARD_SIZE and      # 检查行坐标是否在边界内
-                       0 < cur_y < BOARD_SIZE and      # 检查列坐标是否在边界内
-                       self.board[cur_x][cur_y] == cur_color):  # 检查颜色是否相同
-                    stone_count += 1  # 发现相同颜色棋子，计数加1
-                    # 继续向同一方向移动，检查下一个位置
-                    cur_x += dx * sign
-                    cur_y += dy * sign
-            
-            # 如果连续相同颜色的棋子数达到5个，获胜！
-            if stone_count >= 5:
-                return True
-        
-        # 所有方向都检查完毕，没有找到五子连珠
-        return False
+        # 在位棋盘上用移位和按位与检查四个方向
+        return self.bitboard.is_five(x, y, cur_color)
     
     def is_full(self):
         """
@@ -305,115 +1448,296 @@ class Judge:
             True: 棋盘已满，平局
             False: 棋盘还有空位
         """
-        # 遍历棋盘的每一行
-        for row in self.board:
-            # 检查这一行是否还有空位（0表示空位）
-            if 0 in row:
-                return False  # 发现空位，棋盘未满
-        
-        # 所有位置都非空，棋盘已满
-        return True
+        # 可落子的位置共有(BOARD_SIZE - 1)²个（第0行和第0列不使用）
+        return self.stone_count >= (BOARD_SIZE - 1) ** 2
 
 class AI:
     """人工智能类，负责AI的下棋逻辑"""
     
+    # 空棋盘的得分表：{(玩家权重, AI权重): (玩家得分表, AI得分表, 玩家总分, AI总分)}
+    # 所有AI对象共享，同样权重的AI第二次创建时直接复制，不再逐个位置计算
+    empty_scores = {}
+    
+    # 玩家的得分权重：不同长度的连珠对应不同的分数
+    # 键：连珠长度，值：对应的分数（每个AI对象复制一份，可以用set_weights修改）
+    HUMAN_SCORE_WEIGHTS = {
+        1: 200,    # 单独一子
+        2: 400,    # 两子连珠
+        3: 2000,   # 三子连珠
+        4: 10000,  # 四子连珠（差一子获胜）
+    }
+    
+    # AI的得分权重（略高于玩家，使AI更具攻击性）
+    AI_SCORE_WEIGHTS = {
+        1: 220,    # 比玩家略高
+        2: 420,
+        3: 2100,
+        4: 20000,  # 四子连珠得分远高于玩家
+    }
+    
+    OFFENSIVE_WEIGHT = 1.2  # 进攻权重：鼓励AI积极进攻
+    DEFENSIVE_WEIGHT = 1.0  # 防守权重：阻止玩家连成五子
+    
     def __init__(self):
         """初始化AI"""
-        # 三维数组：记录每个棋盘位置属于哪些获胜模式
-        # win_patterns[x][y][k] = True 表示位置(x,y)属于第k个获胜模式
-        self.win_patterns = [[[False for _ in range(TOTAL_WIN_PATTERNS)] 
-                     for _ in range(BOARD_SIZE)] 
-                     for _ in range(BOARD_SIZE)]
+        # 稀疏索引：win_patterns[x][y] 是位置(x,y)所属的获胜模式编号列表
+        # 这个索引在导入模块时已经构建好，这里直接共享，不再重复构建
+        self.win_patterns = CELL_WIN_PATTERNS
         
         # 记录每个获胜模式中AI已占有的棋子数
-        self.ai_win_count = [0 for _ in range(TOTAL_WIN_PATTERNS)]
+        self.ai_win_count = [0] * TOTAL_WIN_PATTERNS
         
         # 记录每个获胜模式中玩家已占有的棋子数
-        self.human_win_count = [0 for _ in range(TOTAL_WIN_PATTERNS)]
-        
-        # 当前已记录的获胜模式数量
-        self.win_pattern_count = 0
-        
-        # 玩家的得分权重：不同长度的连珠对应不同的分数
-        # 键：连珠长度，值：对应的分数
-        self.human_score_weights = {
-            1: 200,    # 单独一子
-            2: 400,    # 两子连珠
-            3: 2000,   # 三子连珠
-            4: 10000,  # 四子连珠（差一子获胜）
-        }
+        self.human_win_count = [0] * TOTAL_WIN_PATTERNS
         
-        # AI的得分权重（略高于玩家，使AI更具攻击性）
-        self.ai_score_weights = {
-            1: 220,    # 比玩家略高
-            2: 420,
-            3: 2100,
-            4: 20000,  # 四子连珠得分远高于玩家
-        }
+        # AI自己维护的位棋盘，搜索时可以低成本地复制和判断胜负
+        self.bitboard = BitBoard()
+        
+        # 当前局面的Zobrist哈希值，由push_move和pop_move增量更新
+        self.zobrist_hash = 0
+        
+        # 按直线保存的棋盘编码，用来查表得到每个位置的棋形（区分活三、眠三等）
+        self.lines = LineCodes()
+        
+        # 悔棋栈：每一步是 (x, y, color, [(模式编号, 原玩家计数, 原AI计数, 玩家得分变化, AI得分变化), ...])
+        # NumpyAI只记录 (x, y, color, 被改动的获胜模式原来的计数)
+        self.undo_stack = []
+        
+        # 候选落子点：已有棋子周围CANDIDATE_DISTANCE格以内的空位，落子和悔棋时增量维护
+        # near_counts[x][y] 是(x,y)周围的棋子数，大于0的空位就是候选点
+        self.candidates = set()
+        self.near_counts = [[0] * BOARD_SIZE for _ in range(BOARD_SIZE)]
         
-        # 初始化所有可能的获胜模式
-        self.init_win_patterns()
+        # 每个位置当前的玩家得分和AI得分（所属获胜模式得分之和）
+        # 落子时只增量更新受影响的位置，ai_run直接读取，不再从头计算
+        self.human_scores = [[0] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+        self.ai_scores = [[0] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+        
+        # 整个棋盘上所有获胜模式的玩家得分之和与AI得分之和，用于评估局面
+        self.human_total_score = 0
+        self.ai_total_score = 0
+        
+        # 得分权重，从类的默认权重复制
+        self.human_score_weights = dict(self.HUMAN_SCORE_WEIGHTS)
+        self.ai_score_weights = dict(self.AI_SCORE_WEIGHTS)
+        self.offensive_weight = self.OFFENSIVE_WEIGHT
+        self.defensive_weight = self.DEFENSIVE_WEIGHT
+        
+        # 根据初始计数计算每个位置的得分
+        self.rebuild_scores()
     
-    def add_win_pattern(self, start_i, start_j, di, dj):
+    def set_weights(self, human_score_weights=None, ai_score_weights=None,
+                    offensive_weight=None, defensive_weight=None):
         """
-        添加一个获胜模式
+        修改得分权重（用于调参），没有传入的参数保持不变
         
         参数:
-            start_i: 起始行
-            start_j: 起始列
-            di: 行方向增量
-            dj: 列方向增量（与di配合定义方向）
+            human_score_weights: 玩家的得分权重 {连珠长度: 分数}
+            ai_score_weights: AI的得分权重 {连珠长度: 分数}
+            offensive_weight: 进攻权重
+            defensive_weight: 防守权重
         """
-        # 一个获胜模式包含连续的5个位置
-        for k in range(5):
-            # 标记这个获胜模式包含的所有位置
-            self.win_patterns[start_i + k * di][start_j + k * dj][self.win_pattern_count] = True
+        if human_score_weights is not None:
+            self.human_score_weights = dict(human_score_weights)
+        if ai_score_weights is not None:
+            self.ai_score_weights = dict(ai_score_weights)
+        if offensive_weight is not None:
+            self.offensive_weight = offensive_weight
+        if defensive_weight is not None:
+            self.defensive_weight = defensive_weight
         
-        # 获胜模式计数器加1
-        self.win_pattern_count += 1
-
-    def init_win_patterns(self):
-        """初始化所有可能的获胜模式（所有可能的五子连珠位置）"""
-
-        # 横向和纵向的所有赢法
-        for i in range(1, BOARD_SIZE):
-            for j in range(1, BOARD_SIZE - 4):
-                # 水平方向的获胜模式
-                self.add_win_pattern(i, j, 0, 1)
-                # 垂直方向的获胜模式
-                self.add_win_pattern(j, i, 1, 0)
+        # 权重变了，得分表需要重新计算
+        self.rebuild_scores()
+    
+    def rebuild_scores(self):
+        """
+        根据当前的获胜模式计数，重新计算每个位置的得分
+        
+        修改了human_score_weights或ai_score_weights之后需要调用一次，
+        其余时候得分表由update_win_counts增量维护
+        """
+        # 空棋盘（刚创建或者还没落子）的得分表只和权重有关
+        key = None
+        if not self.undo_stack:
+            key = (tuple(sorted(self.human_score_weights.items())),
+                   tuple(sorted(self.ai_score_weights.items())))
+            cached = AI.empty_scores.get(key)
+            if cached is not None:
+                human_scores, ai_scores, self.human_total_score, self.ai_total_score = cached
+                self.human_scores = [list(row) for row in human_scores]
+                self.ai_scores = [list(row) for row in ai_scores]
+                return
+        
+        for i in range(BOARD_SIZE):
+            for j in range(BOARD_SIZE):
+                cur_human_score, cur_ai_score = 0, 0
+                for k in self.win_patterns[i][j]:
+                    cur_human_score += self.human_score_weights.get(
+                        self.human_win_count[k], 0)
+                    cur_ai_score += self.ai_score_weights.get(
+                        self.ai_win_count[k], 0)
+                self.human_scores[i][j] = cur_human_score
+                self.ai_scores[i][j] = cur_ai_score
+        
+        self.human_total_score = sum(self.human_score_weights.get(count, 0)
+                                     for count in self.human_win_count)
+        self.ai_total_score = sum(self.ai_score_weights.get(count, 0)
+                                  for count in self.ai_win_count)
         
-        # 对角线方向的所有赢法
-        for i in range(1, BOARD_SIZE - 4):
-            for j in range(1, BOARD_SIZE - 4):
-                # 右下对角线获胜模式
-                self.add_win_pattern(i, j, 1, 1)
-                # 左下对角线获胜模式
-                self.add_win_pattern(i, BOARD_SIZE - j, 1, -1)
+        if key is not None:
+            AI.empty_scores[key] = (freeze_table(self.human_scores), freeze_table(self.ai_scores),
+                                    self.human_total_score, self.ai_total_score)
+            return
+        
+        # 悔棋栈里记录的得分变化量也要按新的权重重新计算
+        for _, _, color, changes in self.undo_stack:
+            for n, (k, old_human, old_ai, _, _) in enumerate(changes):
+                new_human, new_ai = (6, old_ai + 1) if color == 2 else (old_human + 1, 6)
+                changes[n] = (k, old_human, old_ai,
+                              self.human_score_weights.get(new_human, 0)
+                              - self.human_score_weights.get(old_human, 0),
+                              self.ai_score_weights.get(new_ai, 0)
+                              - self.ai_score_weights.get(old_ai, 0))
     
     def update_win_counts(self, x, y, color):
         """
-        更新获胜模式计数（当棋子落下时调用）
+        更新获胜模式计数（当棋子落下时调用），和push_move相同
+        
+        参数:
+            x: 行坐标
+            y: 列坐标
+            color: 棋子颜色（1:玩家/黑棋，2:AI/白棋）
+        """
+        self.push_move(x, y, color)
+    
+    def push_move(self, x, y, color):
+        """
+        落子：更新获胜模式计数和得分表，并把被改动的计数记到悔棋栈上
+        
+        每一步只记录经过(x,y)的获胜模式（最多20个）原来的计数，
+        pop_move按记录恢复，不需要复制整个计数数组和得分表
         
         参数:
             x: 行坐标
             y: 列坐标
             color: 棋子颜色（1:玩家/黑棋，2:AI/白棋）
         """
-        # 遍历所有获胜模式
-        for k in range(TOTAL_WIN_PATTERNS):
-            # 检查这个位置是否属于第k个获胜模式
-            if self.win_patterns[x][y][k]:
-                if color == 2:  # AI下棋（白棋）
-                    # AI在这个获胜模式中增加一子
-                    self.ai_win_count[k] += 1
-                    # 玩家在这个模式中不可能获胜了（设置为异常值6，超过5）
-                    self.human_win_count[k] = 6
-                else:  # 玩家下棋（黑棋）
-                    # 玩家在这个获胜模式中增加一子
-                    self.human_win_count[k] += 1
-                    # AI在这个模式中不可能获胜了
-                    self.ai_win_count[k] = 6
+        self.bitboard.place(x, y, color)
+        self.lines.place(x, y, color)
+        self.zobrist_hash ^= ZOBRIST_KEYS[color][x][y]
+        self.update_candidates(x, y, True)
+        
+        human_counts, ai_counts = self.human_win_count, self.ai_win_count
+        human_weights, ai_weights = self.human_score_weights, self.ai_score_weights
+        human_scores, ai_scores = self.human_scores, self.ai_scores
+        
+        # 只遍历包含这个位置的获胜模式
+        changes = []
+        for k in self.win_patterns[x][y]:
+            old_human, old_ai = human_counts[k], ai_counts[k]
+            
+            if color == 2:  # AI下棋（白棋）
+                # AI在这个获胜模式中增加一子
+                ai_counts[k] = old_ai + 1
+                # 玩家在这个模式中不可能获胜了（设置为异常值6，超过5）
+                human_counts[k] = 6
+            else:  # 玩家下棋（黑棋）
+                # 玩家在这个获胜模式中增加一子
+                human_counts[k] = old_human + 1
+                # AI在这个模式中不可能获胜了
+                ai_counts[k] = 6
+            
+            # 这个模式的得分变化量，加到它包含的5个位置上，同时记下来供悔棋时减掉
+            delta_human = human_weights.get(human_counts[k], 0) - human_weights.get(old_human, 0)
+            delta_ai = ai_weights.get(ai_counts[k], 0) - ai_weights.get(old_ai, 0)
+            changes.append((k, old_human, old_ai, delta_human, delta_ai))
+            if delta_human or delta_ai:
+                self.human_total_score += delta_human
+                self.ai_total_score += delta_ai
+                for i, j in WIN_PATTERN_CELLS[k]:
+                    human_scores[i][j] += delta_human
+                    ai_scores[i][j] += delta_ai
+        self.undo_stack.append((x, y, color, changes))
+    
+    def pop_move(self):
+        """
+        撤销最后一次push_move
+        
+        返回:
+            (x, y, color): 被撤销的落子
+        """
+        x, y, color, changes = self.undo_stack.pop()
+        
+        human_counts, ai_counts = self.human_win_count, self.ai_win_count
+        human_scores, ai_scores = self.human_scores, self.ai_scores
+        for k, old_human, old_ai, delta_human, delta_ai in changes:
+            human_counts[k], ai_counts[k] = old_human, old_ai
+            if delta_human or delta_ai:
+                self.human_total_score -= delta_human
+                self.ai_total_score -= delta_ai
+                for i, j in WIN_PATTERN_CELLS[k]:
+                    human_scores[i][j] -= delta_human
+                    ai_scores[i][j] -= delta_ai
+        
+        self.bitboard.remove(x, y, color)
+        self.lines.remove(x, y, color)
+        self.zobrist_hash ^= ZOBRIST_KEYS[color][x][y]
+        self.update_candidates(x, y, False)
+        return x, y, color
+
+    def update_candidates(self, x, y, placed):
+        """
+        在(x,y)落子或撤销落子后，更新周围位置的棋子数和候选落子点
+        
+        参数:
+            x: 行坐标
+            y: 列坐标
+            placed: True表示落子（位棋盘已经放上棋子），False表示撤销（已经拿掉棋子）
+        """
+        near_counts, candidates = self.near_counts, self.candidates
+        if placed:
+            candidates.discard((x, y))
+            for i, j in CELL_NEIGHBORHOODS[x][y]:
+                near_counts[i][j] += 1
+                # 第一次靠近棋子的位置才需要检查是否为空
+                if near_counts[i][j] == 1 and self.bitboard.get(i, j) == 0:
+                    candidates.add((i, j))
+        else:
+            for i, j in CELL_NEIGHBORHOODS[x][y]:
+                near_counts[i][j] -= 1
+                if near_counts[i][j] == 0:
+                    candidates.discard((i, j))
+            if near_counts[x][y]:
+                candidates.add((x, y))
+    
+    def candidate_cells(self):
+        """
+        按行优先顺序返回候选落子点
+        
+        返回:
+            [(x, y), ...]，空棋盘时只有天元，棋盘下满时为空列表
+        """
+        if self.candidates:
+            return sorted(self.candidates)
+        if not (self.bitboard.stones[1] | self.bitboard.stones[2]):
+            return [(BOARD_SIZE // 2, BOARD_SIZE // 2)]
+        return []
+    
+    def load_stones(self, black_bits, white_bits):
+        """
+        按位棋盘表示的局面摆上所有棋子（用于在另一个进程里重建局面）
+        
+        获胜模式的得分只和每个模式里双方的棋子数有关，与落子顺序无关，
+        所以按任意顺序摆放都能得到相同的得分表
+        
+        参数:
+            black_bits: 黑棋位图
+            white_bits: 白棋位图
+        """
+        for x, y in BitBoard.iter_cells(black_bits):
+            self.update_win_counts(x, y, 1)
+        for x, y in BitBoard.iter_cells(white_bits):
+            self.update_win_counts(x, y, 2)
 
     def evaluate_position(self, human_score, ai_score):
         """
@@ -426,11 +1750,8 @@ class AI:
         返回:
             综合得分（AI进攻和防守玩家的加权和）
         """
-        OFFENSIVE_WEIGHT = 1.2  # 进攻权重：鼓励AI积极进攻
-        DEFENSIVE_WEIGHT = 1.0  # 防守权重：阻止玩家连成五子
-
         # 综合得分 = AI进攻得分 * 进攻权重 + 防守玩家得分 * 防守权重
-        return ai_score * OFFENSIVE_WEIGHT + human_score * DEFENSIVE_WEIGHT
+        return ai_score * self.offensive_weight + human_score * self.defensive_weight
 
     def ai_run(self, board):
         """
@@ -446,102 +1767,2372 @@ class AI:
         best_pos = (0, 0)  # 最佳位置（默认左上角）
         best_score = -1    # 最佳得分（初始为-1）
         
-        # 遍历棋盘上的所有位置
-        for i in range(1, BOARD_SIZE):
-            for j in range(1, BOARD_SIZE):
-                # 如果这个位置是空的
-                if board[i][j] == 0:
-                    # 重置当前位置i,j得分
-                    cur_human_score, cur_ai_score = 0, 0
-                    
-                    # 遍历所有获胜模式，计算这个位置的得分
-                    for k in range(TOTAL_WIN_PATTERNS):
-                        # 如果这个位置属于第k个获胜模式
-                        if self.win_patterns[i][j][k]:
-                            # 累加玩家在这个模式下的得分
-                            cur_human_score += self.human_score_weights.get(
-                                self.human_win_count[k], 0)
-                            # 累加AI在这个模式下的得分
-                            cur_ai_score += self.ai_score_weights.get(
-                                self.ai_win_count[k], 0)
-                    
-                    # 计算综合得分
-                    cur_score = self.evaluate_position(cur_human_score, cur_ai_score)
-                    
-                    # 如果当前得分更好，更新最佳位置
-                    if cur_score >= best_score:
-                        best_score = cur_score
-                        best_pos = (i, j)
+        # 只遍历候选落子点（已有棋子附近的空位），远处的空位不可能是好棋
+        for i, j in self.candidate_cells():
+            # 得分表已经由update_win_counts维护好，直接计算综合得分
+            cur_score = self.evaluate_position(self.human_scores[i][j],
+                                               self.ai_scores[i][j])
+            
+            # 如果当前得分更好，更新最佳位置
+            if cur_score >= best_score:
+                best_score = cur_score
+                best_pos = (i, j)
         
         # 返回最佳落子位置
         return best_pos
 
-class PopupWindow(Tk):
-    """弹窗类，用于显示游戏结果提示"""
+class ShapeAI(AI):
+    """
+    单步打分的AI，在获胜模式得分之外再加上查表得到的棋形得分
     
-    def __init__(self):
-        """初始化弹窗窗口"""
-        # 调用父类Tk的初始化方法
-        super().__init__()
-        # 隐藏主窗口，我们只需要消息框
-        self.wm_withdraw()
+    只数获胜模式里的棋子时，活三和眠三得分一样；棋形表能区分它们，
+    每个位置只多8次查表（双方各4个方向）
+    """
     
-    def show_message(self, msg):
+    def ai_run(self, board):
         """
-        显示消息框
+        AI主逻辑：选择最佳落子位置
         
         参数:
-            msg: 要显示的消息内容
+            board: 当前棋盘状态
+        
+        返回:
+            (best_i, best_j): 最佳落子位置的行列坐标
         """
-        # 使用tkinter的messagebox显示提示信息
-        # "提示！！！"是窗口标题，msg是具体内容
-        messagebox.showinfo("提示！！！", msg)
+        best_pos = (0, 0)
+        best_score = -1
+        lines = self.lines
+        for i, j in self.candidate_cells():
+            cur_score = self.evaluate_position(
+                self.human_scores[i][j] + lines.shape_score(i, j, 1),
+                self.ai_scores[i][j] + lines.shape_score(i, j, 2))
+            if cur_score >= best_score:
+                best_score = cur_score
+                best_pos = (i, j)
+        return best_pos
 
+class SearchTimeout(Exception):
+    """搜索超过了时间预算，用于从递归深处直接退回到根节点"""
 
-def show_winner_popup():
+class TranspositionTable:
     """
-    显示获胜弹窗的线程函数
+    固定大小的置换表，缓存搜索过的局面
     
-    这个函数在一个单独的线程中运行，定期检查是否需要显示获胜提示。
-    使用多线程可以避免弹窗阻塞游戏主循环。
+    每个桶有两个槽位：一个"深度优先"槽只在新结果搜索得更深时才替换，
+    一个"总是替换"槽保存最近的结果。表的大小在创建时固定，内存占用有上限。
     """
-    # 声明使用全局变量
-    global show_popup_window, winner
     
-    # 无限循环，持续检查是否需要显示弹窗
-    while True:
-        # 使用线程锁，确保安全访问全局变量
-        with lock:
-            # 检查是否需要显示弹窗
-            if show_popup_window:
-                # 创建弹窗对象
-                popup = PopupWindow()
-                
-                # 根据获胜者显示不同的消息
-                if winner:  # winner不为None，表示有获胜者
-                    popup.show_message(f"{winner} 获胜!")
-                else:       # winner为None，表示平局
-                    popup.show_message("平局！")
-                
-                # 重置弹窗标志，避免重复显示
-                show_popup_window = False
-                
-                # 退出循环（弹窗已经显示）
-                break
+    # 评估值的类型：精确值、下界（发生了beta剪枝）、上界（所有落子都没超过alpha）
+    EXACT, LOWER, UPPER = 0, 1, 2
+    
+    def __init__(self, size=1 << 16):
+        """
+        初始化置换表
+        
+        参数:
+            size: 桶的数量，会向上取整为2的幂
+        """
+        self.size = 1 << max(0, (size - 1).bit_length())
+        self.mask = self.size - 1
+        # 每个槽位保存 (哈希值, 深度, 评估值, 类型, 最佳落子) 或 None
+        self.depth_slots = [None] * self.size
+        self.always_slots = [None] * self.size
+        
+        # 统计信息：命中、未命中、冲突（桶里是别的局面）、已使用的槽位数
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.used = 0
+    
+    def probe(self, key):
+        """
+        查找局面
+        
+        参数:
+            key: 局面的哈希值
+        
+        返回:
+            (哈希值, 深度, 评估值, 类型, 最佳落子)，没找到时返回None
+        """
+        index = key & self.mask
+        for entry in (self.depth_slots[index], self.always_slots[index]):
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry
+        
+        self.misses += 1
+        if self.depth_slots[index] is not None or self.always_slots[index] is not None:
+            self.collisions += 1
+        return None
+    
+    def store(self, key, depth, score, flag, best_move):
+        """
+        保存局面的搜索结果
+        
+        参数:
+            key: 局面的哈希值
+            depth: 搜索深度
+            score: 评估值
+            flag: 评估值类型（EXACT / LOWER / UPPER）
+            best_move: 最佳落子
+        """
+        index = key & self.mask
+        entry = (key, depth, score, flag, best_move)
+        old = self.depth_slots[index]
+        # 深度优先槽：空的、同一个局面、或者新结果更深时替换，否则放进总是替换槽
+        if old is None or old[0] == key or depth >= old[1]:
+            self.depth_slots[index] = entry
+            self.used += old is None
+        else:
+            self.used += self.always_slots[index] is None
+            self.always_slots[index] = entry
+    
+    def clear(self):
+        """清空置换表和统计信息"""
+        self.depth_slots = [None] * self.size
+        self.always_slots = [None] * self.size
+        self.hits = self.misses = self.collisions = self.used = 0
+    
+    def memory_bytes(self):
+        """
+        估算置换表占用的内存（字节）
         
-        # 暂停0.5秒再检查，避免过度占用CPU
-        time.sleep(0.5)
+        包括两个槽位列表本身，以及已保存条目的元组和其中的整数
+        """
+        entry_bytes = sys.getsizeof((0, 0, 0, 0, None)) + 3 * sys.getsizeof(1 << 63) + \
+            sys.getsizeof((0, 0))
+        return sys.getsizeof(self.depth_slots) + sys.getsizeof(self.always_slots) + \
+            self.used * entry_bytes
+    
+    def stats(self):
+        """返回命中、未命中、冲突次数和估算的内存占用"""
+        return {
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "memory_bytes": self.memory_bytes(),
+        }
 
-def main():
-    """程序主入口函数"""
-    # 创建游戏对象
-    game = GomokuGame()
+class SearchAI(AI):
+    """
+    使用负极大值搜索（negamax）加alpha-beta剪枝的AI
+    
+    在AI.ai_run的单步打分基础上向后看若干步，能发现连续的强制手段。
+    通过depth（搜索深度）、max_nodes（节点数上限）和max_candidates
+    （每层最多展开的候选点数）在棋力和思考时间之间取舍。
+    """
+    
+    # 获胜局面的分数，远大于任何启发式评估值
+    WIN_SCORE = 10 ** 9
+    
+    def __init__(self, depth=3, max_nodes=20000, max_candidates=10, tt_size=1 << 16,
+                 time_budget_ms=None):
+        """
+        初始化搜索AI
+        
+        参数:
+            depth: 搜索深度（向后看的步数）；有时间预算时是迭代加深的最大深度
+            max_nodes: 每次搜索最多访问的节点数，超过后不再展开
+            max_candidates: 每个局面最多展开的候选落子数
+            tt_size: 置换表的桶数量
+            time_budget_ms: 每一步的默认思考时间（毫秒），为None时不限时间
+        """
+        super().__init__()
+        self.depth = depth
+        self.max_nodes = max_nodes
+        self.max_candidates = max_candidates
+        self.time_budget_ms = time_budget_ms
+        
+        # 限时搜索的截止时间（time.perf_counter()的值），为None时不检查
+        self.deadline = None
+        # 取消标志（threading.Event），由别的线程设置后搜索尽快停下，为None时不检查
+        self.cancel = None
+        
+        # 置换表在多次搜索之间保留：哈希值包含了整个局面，旧结果仍然有效
+        self.tt = TranspositionTable(tt_size)
+        
+        # 每一方的"成五点"：落下就能连成五子的空位（来自只差一子的获胜模式）
+        self.four_cells = {1: set(), 2: set()}
+        
+        # 成五点的悔棋栈，和AI的悔棋栈一一对应：(被落子占掉的成五点颜色, 新增的成五点)
+        self.four_cells_undo = []
+        
+        # 上一次搜索的统计信息：深度、节点数、耗时、每秒节点数、评估值
+        self.search_stats = {}
+        self.nodes = 0
+    
+    def push_move(self, x, y, color):
+        """
+        落子并维护双方的成五点，成五点的变化记到自己的悔棋栈上
+        
+        参数:
+            x: 行坐标
+            y: 列坐标
+            color: 棋子颜色（1:玩家/黑棋，2:AI/白棋）
+        """
+        # 以(x,y)为成五点的模式一定经过(x,y)，这里落子后它们都不再是威胁
+        removed = [c for c in (1, 2) if (x, y) in self.four_cells[c]]
+        for c in removed:
+            self.four_cells[c].discard((x, y))
+        
+        super().push_move(x, y, color)
+        
+        # 新的成五点只可能出现在经过(x,y)、属于color一方的获胜模式里
+        counts = self.ai_win_count if color == 2 else self.human_win_count
+        four_cells = self.four_cells[color]
+        added = []
+        for k in self.win_patterns[x][y]:
+            if counts[k] == 4:
+                for i, j in WIN_PATTERN_CELLS[k]:
+                    if self.bitboard.get(i, j) == 0 and (i, j) not in four_cells:
+                        four_cells.add((i, j))
+                        added.append((i, j))
+        self.four_cells_undo.append((removed, added))
+    
+    def pop_move(self):
+        """撤销最后一次push_move，同时恢复成五点"""
+        x, y, color = super().pop_move()
+        removed, added = self.four_cells_undo.pop()
+        self.four_cells[color].difference_update(added)
+        for c in removed:
+            self.four_cells[c].add((x, y))
+        return x, y, color
+    
+    def evaluate_board(self, color):
+        """
+        静态评估整个局面
+        
+        evaluate_position是进攻分和防守分的线性加权，传入负的玩家得分，
+        得到的就是"AI优势 - 玩家优势"
+        
+        参数:
+            color: 轮到谁下棋（1:玩家/黑棋，2:AI/白棋）
+        
+        返回:
+            站在color一方的局面得分
+        """
+        score = self.evaluate_position(-self.human_total_score, self.ai_total_score)
+        return score if color == 2 else -score
+    
+    def candidate_moves(self, color):
+        """
+        生成候选落子点：已有棋子周围2格以内的空位，按当前得分从高到低排序
+        
+        参数:
+            color: 轮到谁下棋
+        
+        返回:
+            [(x, y), ...] 候选落子列表，空棋盘时返回天元
+        """
+        cells = self.candidate_cells()
+        
+        # 站在color一方给每个位置打分：自己的得分算进攻，对方的得分算防守
+        if color == 2:
+            own, opponent = self.ai_scores, self.human_scores
+        else:
+            own, opponent = self.human_scores, self.ai_scores
+        cells.sort(key=lambda cell: self.evaluate_position(
+            opponent[cell[0]][cell[1]], own[cell[0]][cell[1]]), reverse=True)
+        return cells
+    
+    def position_key(self, color):
+        """当前局面（包括轮到谁下）的哈希值"""
+        return self.zobrist_hash ^ ZOBRIST_BLACK_TO_MOVE if color == 1 else self.zobrist_hash
     
-    # 创建并启动弹窗线程
-    # target: 线程要执行的函数
-    # daemon=True: 设置为守护线程，主程序退出时自动结束
-    popup_thread = threading.Thread(target=show_winner_popup, daemon=True)
-    popup_thread.start()  # 启动线程
+    def generate_moves(self, color):
+        """
+        生成搜索时要展开的落子
+        
+        对方有成五点时只能去堵（堵不住的情况在negamax里已经判定为输），
+        否则取得分最高的max_candidates个候选点
+        
+        参数:
+            color: 轮到谁下棋
+        
+        返回:
+            [(x, y), ...] 要展开的落子列表
+        """
+        threats = self.four_cells[3 - color]
+        if threats:
+            return sorted(threats)
+        return self.candidate_moves(color)[:self.max_candidates]
+    
+    def negamax(self, color, depth, alpha, beta, ply):
+        """
+        负极大值搜索 + alpha-beta剪枝
+        
+        参数:
+            color: 轮到谁下棋
+            depth: 剩余搜索深度
+            alpha: 当前一方已经能保证的最低分
+            beta: 对方允许的最高分
+            ply: 距离根节点的步数（越快获胜分数越高）
+        
+        返回:
+            站在color一方的局面得分
+        """
+        self.nodes += 1
+        # 每16个节点检查一次是否超时或被取消
+        if not self.nodes & 15 and (
+                (self.deadline is not None and time.perf_counter() > self.deadline)
+                or (self.cancel is not None and self.cancel.is_set())):
+            raise SearchTimeout()
+        
+        # 自己有成五点：这一步就能获胜，不需要继续搜索
+        if self.four_cells[color]:
+            return self.WIN_SCORE - ply
+        # 对方有两个以上的成五点：只能堵住一个，下一步对方获胜
+        if len(self.four_cells[3 - color]) >= 2:
+            return -(self.WIN_SCORE - ply - 1)
+        
+        if depth == 0 or self.nodes >= self.max_nodes:
+            return self.evaluate_board(color)
+        
+        # 查置换表：同一个局面已经搜索到足够深度时直接使用结果
+        key = self.position_key(color)
+        alpha_orig = alpha
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            _, tt_depth, tt_score, tt_flag, tt_move = entry
+            if tt_depth >= depth:
+                tt_score = self.score_from_tt(tt_score, ply)
+                if tt_flag == TranspositionTable.EXACT:
+                    return tt_score
+                if tt_flag == TranspositionTable.LOWER and tt_score > alpha:
+                    alpha = tt_score
+                elif tt_flag == TranspositionTable.UPPER and tt_score < beta:
+                    beta = tt_score
+                if alpha >= beta:
+                    return tt_score
+        
+        moves = self.generate_moves(color)
+        if not moves:
+            return 0  # 没有地方可下，平局
+        # 置换表里记录的最佳落子最先尝试
+        if tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        
+        best_score, best_move = -self.WIN_SCORE, moves[0]
+        for x, y in moves:
+            self.push_move(x, y, color)
+            score = -self.negamax(3 - color, depth - 1, -beta, -alpha, ply + 1)
+            self.pop_move()
+            
+            if score > best_score:
+                best_score, best_move = score, (x, y)
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break  # 对方不会允许走到这里，剪枝
+        
+        # 达到节点上限后的结果不完整，不保存
+        if self.nodes < self.max_nodes:
+            if best_score <= alpha_orig:
+                flag = TranspositionTable.UPPER
+            elif best_score >= beta:
+                flag = TranspositionTable.LOWER
+            else:
+                flag = TranspositionTable.EXACT
+            self.tt.store(key, depth, self.score_to_tt(best_score, ply), flag, best_move)
+        return best_score
+    
+    def score_to_tt(self, score, ply):
+        """
+        把评估值转换成与搜索路径无关的形式再存入置换表
+        
+        获胜分数里包含了"距离根节点的步数"，存表时改为"距离当前局面的步数"
+        """
+        if score > self.WIN_SCORE - 1000:
+            return score + ply
+        if score < -self.WIN_SCORE + 1000:
+            return score - ply
+        return score
+    
+    def score_from_tt(self, score, ply):
+        """score_to_tt的逆运算"""
+        if score > self.WIN_SCORE - 1000:
+            return score - ply
+        if score < -self.WIN_SCORE + 1000:
+            return score + ply
+        return score
+    
+    def search(self, color, depth):
+        """
+        从当前局面开始搜索color一方的最佳落子
+        
+        参数:
+            color: 轮到谁下棋
+            depth: 搜索深度
+        
+        返回:
+            (best_pos, best_score): 最佳落子位置和它的评估值
+        """
+        # 自己有成五点，直接获胜
+        if self.four_cells[color]:
+            return min(self.four_cells[color]), self.WIN_SCORE
+        
+        moves = self.generate_moves(color)
+        if not moves:
+            return (0, 0), 0
+        # 上一轮迭代（或者上一次搜索）留下的最佳落子最先尝试
+        key = self.position_key(color)
+        entry = self.tt.probe(key)
+        if entry is not None and entry[4] in moves:
+            moves.remove(entry[4])
+            moves.insert(0, entry[4])
+        
+        best_pos, best_score = moves[0], -self.WIN_SCORE - 1
+        alpha, beta = -self.WIN_SCORE - 1, self.WIN_SCORE + 1
+        for x, y in moves:
+            self.push_move(x, y, color)
+            score = -self.negamax(3 - color, depth - 1, -beta, -alpha, 1)
+            self.pop_move()
+            
+            if score > best_score:
+                best_pos, best_score = (x, y), score
+            if score > alpha:
+                alpha = score
+        
+        self.tt.store(key, depth, self.score_to_tt(best_score, 0),
+                      TranspositionTable.EXACT, best_pos)
+        return best_pos, best_score
+    
+    def iterative_deepening(self, color, time_budget_ms):
+        """
+        限时搜索：从深度1开始逐层加深，直到用完时间或者达到最大深度
+        
+        每完成一层就更新"目前最佳落子"，超时时放弃没搜完的那一层。
+        前一层的最佳落子存在置换表里，下一层会最先尝试它。
+        
+        参数:
+            color: 轮到谁下棋
+            time_budget_ms: 思考时间（毫秒）
+        
+        返回:
+            (best_pos, best_score, depth): 最佳落子、评估值和完整搜索过的深度
+        """
+        self.deadline = time.perf_counter() + time_budget_ms / 1000
+        
+        # 还没有完成任何一层时，用得分最高的候选点兜底
+        moves = self.generate_moves(color)
+        best_pos = moves[0] if moves else (0, 0)
+        best_score, reached = 0, 0
+        
+        stack_size = len(self.undo_stack)
+        try:
+            for depth in range(1, self.depth + 1):
+                best_pos, best_score = self.search(color, depth)
+                reached = depth
+                # 已经找到必胜或必败，再加深也不会改变结果
+                if abs(best_score) > self.WIN_SCORE - 1000:
+                    break
+        except SearchTimeout:
+            # 超时时递归被打断，试走的棋子还没有撤回，逐步撤回到搜索前的状态
+            while len(self.undo_stack) > stack_size:
+                self.pop_move()
+        finally:
+            self.deadline = None
+        return best_pos, best_score, reached
+    
+    def ai_run(self, board, color=2, time_budget_ms=None):
+        """
+        AI主逻辑：搜索最佳落子位置
+        
+        参数:
+            board: 当前棋盘状态（搜索使用AI自己维护的位棋盘，这里只为兼容AI.ai_run）
+            color: 轮到谁下棋，默认是AI（白棋）
+            time_budget_ms: 思考时间（毫秒），为None时使用创建时设置的时间预算；
+                            都没有设置时按固定深度搜索
+        
+        返回:
+            (best_i, best_j): 最佳落子位置的行列坐标
+        """
+        if time_budget_ms is None:
+            time_budget_ms = self.time_budget_ms
+        
+        self.nodes = 0
+        start = time.perf_counter()
+        if time_budget_ms is None:
+            best_pos, best_score = self.search(color, self.depth)
+            depth = self.depth
+        else:
+            best_pos, best_score, depth = self.iterative_deepening(color, time_budget_ms)
+        elapsed = time.perf_counter() - start
+        
+        self.search_stats = {
+            "depth": depth,
+            "nodes": self.nodes,
+            "time_ms": elapsed * 1000,
+            "nps": self.nodes / elapsed if elapsed > 0 else 0,
+            "score": best_score,
+            "tt": self.tt.stats(),
+        }
+        return best_pos
+    
+    def format_search_stats(self):
+        """把上一次搜索的统计信息格式化成一行文字"""
+        stats = self.search_stats
+        tt = stats["tt"]
+        return (f"深度 {stats['depth']}，节点 {stats['nodes']}，"
+                f"耗时 {stats['time_ms']:.1f} ms，{stats['nps']:.0f} 节点/秒，"
+                f"评估值 {stats['score']:.0f}，置换表 命中 {tt['hits']} / "
+                f"未命中 {tt['misses']} / 冲突 {tt['collisions']}，"
+                f"约 {tt['memory_bytes'] / 1024:.0f} KB")
+
+def warm_up_search_worker():
+    """
+    进程池工作进程的初始化函数
+    
+    获胜模式表、位棋盘掩码和Zobrist表在导入模块时已经构建好，
+    这里再创建一次SearchAI（顺便加载棋形表），让第一次真正的搜索不用付出任何初始化开销
+    """
+    SearchAI(tt_size=1)
+
+def search_root_move(black_bits, white_bits, color, move, depth, max_nodes, max_candidates,
+                     alpha=-SearchAI.WIN_SCORE - 1):
+    """
+    在工作进程里搜索一个根节点落子
+    
+    只关心这一步能不能比已经搜过的落子更好，所以用(alpha, +∞)的窗口搜索：
+    得分不超过alpha时只说明它不更好，超过alpha时得分是准确的
+    
+    参数:
+        black_bits: 黑棋位图
+        white_bits: 白棋位图
+        color: 根节点轮到谁下棋
+        move: 要搜索的根节点落子(x, y)
+        depth: 搜索深度（包括这一步）
+        max_nodes: 这一步最多访问的节点数
+        max_candidates: 每个局面最多展开的候选落子数
+        alpha: 已经搜过的落子中最好的得分
+    
+    返回:
+        (score, nodes): 站在color一方的评估值（不超过alpha时只是上界），以及访问的节点数
+    """
+    # 每个任务使用全新的搜索状态，结果不受这个进程之前做过哪些任务的影响
+    ai = SearchAI(depth=depth, max_nodes=max_nodes, max_candidates=max_candidates,
+                  tt_size=1 << 12)
+    ai.load_stones(black_bits, white_bits)
+    
+    x, y = move
+    ai.update_win_counts(x, y, color)
+    score = -ai.negamax(3 - color, depth - 1, -SearchAI.WIN_SCORE - 1, -alpha, 1)
+    return score, ai.nodes
+
+def start_search_pool(workers):
+    """
+    创建搜索用的进程池，并让每个工作进程都完成初始化
+    
+    参数:
+        workers: 工作进程数量
+    
+    返回:
+        ProcessPoolExecutor对象
+    """
+    # 只有并行搜索和自我对弈用到进程池，用到时再导入
+    from concurrent.futures import ProcessPoolExecutor
+    
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=warm_up_search_worker)
+    # 提交和进程数一样多的空任务，让所有工作进程都提前启动
+    for future in [executor.submit(int) for _ in range(workers)]:
+        future.result()
+    return executor
+
+# 游戏里所有对局共用的搜索进程池：{工作进程数: ProcessPoolExecutor}
+SHARED_SEARCH_POOLS = {}
+SHARED_SEARCH_POOLS_LOCK = threading.Lock()
+
+def create_parallel_ai(workers, **options):
+    """
+    创建使用共用进程池的ParallelSearchAI
+    
+    进程池在第一次创建AI时才启动（游戏里是窗口显示出来之后，在准备AI的后台线程里），
+    之后的对局直接复用
+    
+    参数:
+        workers: 工作进程数量
+        options: ParallelSearchAI的其余参数（depth、max_nodes等）
+    
+    返回:
+        ParallelSearchAI对象
+    """
+    with SHARED_SEARCH_POOLS_LOCK:
+        if workers not in SHARED_SEARCH_POOLS:
+            SHARED_SEARCH_POOLS[workers] = start_search_pool(workers)
+        executor = SHARED_SEARCH_POOLS[workers]
+    return ParallelSearchAI(workers=workers, executor=executor, **options)
+
+class ParallelSearchAI(SearchAI):
+    """
+    根节点并行的搜索AI
+    
+    排序最靠前（最可能最好）的落子先在本进程里用完整窗口搜索，它的得分作为alpha，
+    其余的候选落子分给进程池里的多个工作进程分别搜索，绕开GIL使用多核。
+    没有alpha时每个落子都要完整搜索，节点数是串行搜索的两三倍。
+    工作进程常驻并且已经构建好所有表，每一步只传送两个位图整数和alpha。
+    汇总结果时按候选落子的顺序比较，得分相同取排在前面的，
+    所以选出的落子与工作进程数量和完成顺序无关。
+    """
+    
+    def __init__(self, workers=None, depth=4, max_nodes=20000, max_candidates=10,
+                 executor=None):
+        """
+        初始化并行搜索AI
+        
+        参数:
+            workers: 工作进程数量，为None时使用CPU核数
+            depth: 搜索深度
+            max_nodes: 每个根节点落子最多访问的节点数
+            max_candidates: 每个局面最多展开的候选落子数
+            executor: 共用的进程池（由start_search_pool创建），为None时第一次搜索时自己创建
+        """
+        super().__init__(depth=depth, max_nodes=max_nodes, max_candidates=max_candidates)
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = executor
+        # 只关闭自己创建的进程池
+        self.owns_executor = executor is None
+    
+    def start(self):
+        """启动进程池（已经启动时什么也不做）"""
+        if self.executor is None:
+            self.executor = start_search_pool(self.workers)
+    
+    def close(self):
+        """关闭自己创建的进程池"""
+        if self.executor is not None and self.owns_executor:
+            self.executor.shutdown()
+        self.executor = None
+    
+    def ai_run(self, board, color=2, time_budget_ms=None):
+        """
+        AI主逻辑：并行搜索最佳落子位置
+        
+        参数:
+            board: 当前棋盘状态（搜索使用AI自己维护的位棋盘，这里只为兼容AI.ai_run）
+            color: 轮到谁下棋，默认是AI（白棋）
+            time_budget_ms: 并行模式按固定深度搜索，不使用这个参数
+        
+        返回:
+            (best_i, best_j): 最佳落子位置的行列坐标
+        """
+        start = time.perf_counter()
+        nodes = 0
+        
+        if self.four_cells[color]:
+            # 自己有成五点，直接获胜
+            best_pos, best_score = min(self.four_cells[color]), self.WIN_SCORE
+        else:
+            moves = self.generate_moves(color)
+            best_pos, best_score = (moves[0] if moves else (0, 0)), 0
+            if moves:
+                # 第一个落子在本进程里串行搜索，得到其余落子要超过的alpha
+                self.nodes = 0
+                self.push_move(best_pos[0], best_pos[1], color)
+                best_score = -self.negamax(3 - color, self.depth - 1, -self.WIN_SCORE - 1,
+                                           self.WIN_SCORE + 1, 1)
+                self.pop_move()
+                nodes = self.nodes
+            if len(moves) > 1:
+                self.start()
+                black_bits, white_bits = self.bitboard.stones[1], self.bitboard.stones[2]
+                futures = [self.executor.submit(search_root_move, black_bits, white_bits,
+                                                color, move, self.depth, self.max_nodes,
+                                                self.max_candidates, best_score)
+                           for move in moves[1:]]
+                
+                # 按候选落子的顺序汇总，只有严格更高的分数才替换
+                for move, future in zip(moves[1:], futures):
+                    score, move_nodes = future.result()
+                    nodes += move_nodes
+                    if score > best_score:
+                        best_pos, best_score = move, score
+        elapsed = time.perf_counter() - start
+        
+        self.nodes = nodes
+        self.search_stats = {
+            "depth": self.depth,
+            "nodes": nodes,
+            "time_ms": elapsed * 1000,
+            "nps": nodes / elapsed if elapsed > 0 else 0,
+            "score": best_score,
+            "tt": self.tt.stats(),
+        }
+        return best_pos
+
+class MCTSNode:
+    """蒙特卡洛树的节点，用__slots__减少每个节点占用的内存"""
+    
+    __slots__ = ("move", "parent", "children", "untried", "visits", "wins", "prior")
+    
+    def __init__(self, move=None, parent=None, prior=0.0):
+        """
+        参数:
+            move: 从父节点走到这个节点的落子(x, y)，根节点为None
+            parent: 父节点
+            prior: 按获胜模式得分估计的先验概率（0到1）
+        """
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = None  # 还没有展开的落子，第一次访问时才生成
+        self.visits = 0
+        self.wins = 0.0      # 走到这个节点的一方累计的得分（胜1，负0）
+        self.prior = prior
+
+class MCTSAI(SearchAI):
+    """
+    蒙特卡洛树搜索（UCT）AI
+    
+    每次模拟从根节点按UCT公式选到叶子，展开一个新节点，再用获胜模式得分作为策略
+    快速下几步（rollout），把胜负沿路径回传。展开和rollout都只考虑得分最高的几个
+    候选点，所以模拟的棋不会太离谱。继承SearchAI以复用成五点的维护、候选落子的排序
+    和push_move/pop_move。
+    """
+    
+    def __init__(self, playouts=2000, time_budget_ms=None, max_children=8,
+                 rollout_depth=10, exploration=0.7, max_tree_nodes=200000, seed=None):
+        """
+        初始化MCTS AI
+        
+        参数:
+            playouts: 每一步最多模拟的次数
+            time_budget_ms: 每一步的思考时间（毫秒），为None时只按模拟次数限制
+            max_children: 每个节点最多展开的子节点数（按得分从高到低）
+            rollout_depth: rollout最多下的步数，下完后按局面评估估计胜率
+            exploration: UCT公式中探索项的系数
+            max_tree_nodes: 树的最大节点数，达到后不再展开新节点
+            seed: rollout随机数种子
+        """
+        super().__init__(max_candidates=max_children, time_budget_ms=time_budget_ms)
+        self.playouts = playouts
+        self.rollout_depth = rollout_depth
+        self.exploration = exploration
+        self.max_tree_nodes = max_tree_nodes
+        self.rng = random.Random(seed)
+        
+        # 保留的搜索树：root对应从空棋盘依次下出root_moves中的(x, y, color)后的局面
+        self.root = None
+        self.root_moves = ()
+        self.tree_nodes = 0
+    
+    def expand_moves(self, node, color):
+        """第一次访问节点时生成要展开的落子，并按得分给出先验概率"""
+        moves = self.generate_moves(color)
+        if color == 2:
+            own, opponent = self.ai_scores, self.human_scores
+        else:
+            own, opponent = self.human_scores, self.ai_scores
+        scores = [self.evaluate_position(opponent[x][y], own[x][y]) for x, y in moves]
+        top = max(scores, default=0) or 1
+        # 按得分从低到高保存，pop()先取出得分最高的
+        node.untried = [(move, score / top) for move, score in zip(moves, scores)][::-1]
+    
+    def select_child(self, node):
+        """按UCT公式（加上随访问次数衰减的先验项）选择子节点"""
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+        best, best_value = None, -1.0
+        for child in node.children:
+            value = (child.wins / child.visits
+                     + exploration * math.sqrt(log_visits / child.visits)
+                     + child.prior / (child.visits + 1))
+            if value > best_value:
+                best, best_value = child, value
+        return best
+    
+    def terminal_value(self, color):
+        """
+        color一方落子前的局面是否已经分出胜负
+        
+        返回:
+            color一方的得分（1胜0负），还没有分出胜负时返回None
+        """
+        if self.four_cells[color]:
+            return 1.0
+        if len(self.four_cells[3 - color]) >= 2:
+            return 0.0
+        return None
+    
+    def rollout(self, color):
+        """
+        从当前局面快速下rollout_depth步，得到color一方的估计得分
+        
+        每一步在得分最高的三个候选点中随机选（越靠前概率越大），
+        没有分出胜负时按局面评估值换算成0到1之间的胜率
+        """
+        pushed = 0
+        to_move = color
+        value = None
+        for _ in range(self.rollout_depth):
+            value = self.terminal_value(to_move)
+            if value is not None:
+                break
+            moves = self.generate_moves(to_move)
+            if not moves:
+                value = 0.5
+                break
+            r = self.rng.random()
+            index = 0 if r < 0.6 or len(moves) == 1 else (1 if r < 0.85 or len(moves) == 2 else 2)
+            self.push_move(*moves[index], to_move)
+            pushed += 1
+            to_move = 3 - to_move
+        
+        if value is None:
+            value = self.terminal_value(to_move)
+        if value is None:
+            # 局面评估值换算成胜率，20000约等于一个冲四的得分
+            value = 1 / (1 + math.exp(-self.evaluate_board(to_move) / 20000))
+        for _ in range(pushed):
+            self.pop_move()
+        
+        # 换算成color一方的得分
+        return value if to_move == color else 1 - value
+    
+    def playout(self, root, color):
+        """做一次模拟：选择、展开、rollout、回传"""
+        node, to_move, pushed = root, color, 0
+        value = self.terminal_value(to_move)
+        
+        # 选择：沿着已经完全展开的节点往下走
+        while value is None and node.untried == [] and node.children:
+            node = self.select_child(node)
+            self.push_move(*node.move, to_move)
+            pushed += 1
+            to_move = 3 - to_move
+            value = self.terminal_value(to_move)
+        
+        if value is None:
+            if node.untried is None:
+                self.expand_moves(node, to_move)
+            # 展开：加入一个新的子节点（树太大时不再展开，直接从这里rollout）
+            if node.untried and self.tree_nodes < self.max_tree_nodes:
+                move, prior = node.untried.pop()
+                child = MCTSNode(move, node, prior)
+                node.children.append(child)
+                self.tree_nodes += 1
+                node = child
+                self.push_move(*move, to_move)
+                pushed += 1
+                to_move = 3 - to_move
+                value = self.terminal_value(to_move)
+            if value is None:
+                value = self.rollout(to_move)
+        
+        for _ in range(pushed):
+            self.pop_move()
+        
+        # 回传：value是to_move一方的得分，节点记录的是走到这个节点的一方的得分
+        while node is not None:
+            node.visits += 1
+            node.wins += 1 - value
+            value = 1 - value
+            node = node.parent
+    
+    def reuse_tree(self):
+        """
+        沿着上次搜索以来实际下出的落子往下走，保留对应的子树
+        
+        返回:
+            True: 复用了旧的搜索树
+            False: 没有可以复用的子树，创建新的根节点
+        """
+        moves = tuple(entry[:3] for entry in self.undo_stack)
+        root_size = len(self.root_moves)
+        node = self.root
+        # 悔棋后又下了别的棋时，悔棋栈长度可能和上次一样，要逐步比较落子才知道树还能不能用
+        if node is not None and moves[:root_size] == self.root_moves:
+            for x, y, _ in moves[root_size:]:
+                node = next((child for child in node.children if child.move == (x, y)), None)
+                if node is None:
+                    break
+        else:
+            node = None
+        
+        self.root_moves = moves
+        if node is None:
+            self.root, self.tree_nodes = MCTSNode(), 1
+            return False
+        
+        # 断开父节点，旧树的其余部分由垃圾回收释放
+        node.parent = None
+        node.move = None
+        self.root = node
+        self.tree_nodes = self.count_nodes(node)
+        return True
+    
+    @staticmethod
+    def count_nodes(node):
+        """统计子树的节点数"""
+        count, stack = 0, [node]
+        while stack:
+            current = stack.pop()
+            count += 1
+            stack.extend(current.children)
+        return count
+    
+    def ai_run(self, board, color=2, time_budget_ms=None):
+        """
+        AI主逻辑：模拟到次数或时间用完，选择访问次数最多的落子
+        
+        参数:
+            board: 当前棋盘状态（只为兼容AI.ai_run）
+            color: 轮到谁下棋，默认是AI（白棋）
+            time_budget_ms: 思考时间（毫秒），为None时使用创建时设置的时间预算
+        
+        返回:
+            (best_i, best_j): 最佳落子位置的行列坐标
+        """
+        if time_budget_ms is None:
+            time_budget_ms = self.time_budget_ms
+        start = time.perf_counter()
+        self.deadline = start + time_budget_ms / 1000 if time_budget_ms is not None else None
+        
+        reused = self.reuse_tree()
+        root = self.root
+        reused_visits = root.visits
+        
+        # 自己有成五点，直接获胜
+        if self.four_cells[color]:
+            best_pos = min(self.four_cells[color])
+            playouts = 0
+        else:
+            playouts = 0
+            while playouts < self.playouts:
+                if self.deadline is not None and time.perf_counter() > self.deadline:
+                    break
+                # 预判被取消时，下一次模拟前就停下
+                if self.cancel is not None and self.cancel.is_set():
+                    break
+                self.playout(root, color)
+                playouts += 1
+            
+            if root.children:
+                best_pos = max(root.children, key=lambda child: child.visits).move
+            else:
+                moves = self.generate_moves(color)
+                best_pos = moves[0] if moves else (0, 0)
+        self.deadline = None
+        elapsed = time.perf_counter() - start
+        
+        best_child = next((child for child in root.children if child.move == best_pos), None)
+        self.search_stats = {
+            "playouts": playouts,
+            "time_ms": elapsed * 1000,
+            "pps": playouts / elapsed if elapsed > 0 else 0,
+            "reused": reused_visits if reused else 0,
+            "tree_nodes": self.tree_nodes,
+            "win_rate": best_child.wins / best_child.visits if best_child else 1.0,
+        }
+        return best_pos
+    
+    def format_search_stats(self):
+        """把上一次搜索的统计信息格式化成一行文字"""
+        stats = self.search_stats
+        return (f"MCTS 模拟 {stats['playouts']} 次，耗时 {stats['time_ms']:.1f} ms，"
+                f"{stats['pps']:.0f} 次/秒，复用 {stats['reused']} 次旧模拟，"
+                f"树节点 {stats['tree_nodes']}，胜率 {stats['win_rate']:.1%}")
+
+class ThreatSolver:
+    """
+    威胁空间搜索：只展开冲四和活三，用来发现必胜的连续进攻
+    
+    VCF（连续冲四取胜）：进攻方每一步都是冲四，防守方只能堵唯一的空位
+    VCT（连续攻击取胜）：进攻方每一步是冲四或活三，防守方可以堵活三的任意
+    一个空位，也可以用自己的冲四反击，进攻方必须对所有应对都能取胜
+    
+    只展开很少的落子，所以证明一个必胜往往只要几百个节点，比全宽度搜索快得多。
+    节点数或时间用完时放弃（返回None），不会给出错误的必胜。
+    
+    求解时按棋子数记录每一方"对方没有棋子"的获胜模式（live），
+    找成五点、冲四点时只检查这些模式，不用每个节点都扫描全部获胜模式。
+    """
+    
+    def __init__(self, max_nodes=3000, vcf_depth=12, vct_depth=4):
+        """
+        参数:
+            max_nodes: 每次求解最多访问的节点数
+            vcf_depth: VCF最多连续冲四的步数
+            vct_depth: VCT中活三进攻最多的步数（冲四不计入）
+        """
+        self.max_nodes = max_nodes
+        self.vcf_depth = vcf_depth
+        self.vct_depth = vct_depth
+        
+        # 求解时使用的棋盘副本，以及每个获胜模式中黑白双方的棋子数
+        self.board = None
+        self.counts = None
+        # live[color][n]: color方恰好有n个棋子、对方没有棋子的获胜模式编号集合（n为1~5）
+        self.live = None
+        self.nodes = 0
+        # 求解时的取消标志（threading.Event）和截止时间（perf_counter时间），为None时不检查
+        self.cancel = None
+        self.deadline = None
+        
+        # 上一次求解的统计信息
+        self.stats = {"nodes": 0, "time_ms": 0.0, "kind": None, "line": None}
+    
+    def copy(self):
+        """
+        创建一个参数相同的新求解器
+        
+        求解时会改动board、counts和nodes，几个线程同时求解时每个线程要用自己的求解器
+        """
+        return ThreatSolver(self.max_nodes, self.vcf_depth, self.vct_depth)
+    
+    def load(self, board):
+        """
+        从棋盘复制局面，并统计每个获胜模式中双方的棋子数
+        
+        参数:
+            board: Judge.board格式的二维列表
+        """
+        self.board = [row[:] for row in board]
+        self.counts = [None, [0] * TOTAL_WIN_PATTERNS, [0] * TOTAL_WIN_PATTERNS]
+        for x in range(1, BOARD_SIZE):
+            for y in range(1, BOARD_SIZE):
+                color = self.board[x][y]
+                if color:
+                    for k in CELL_WIN_PATTERNS[x][y]:
+                        self.counts[color][k] += 1
+        
+        self.live = [None, [set() for _ in range(6)], [set() for _ in range(6)]]
+        for color in (1, 2):
+            own, other = self.counts[color], self.counts[3 - color]
+            for k in range(len(WIN_PATTERN_CELLS)):
+                if own[k] and not other[k]:
+                    self.live[color][own[k]].add(k)
+    
+    def place(self, x, y, color):
+        """在求解用的棋盘上落子，同时更新双方的live集合"""
+        self.board[x][y] = color
+        own, other = self.counts[color], self.counts[3 - color]
+        own_live, other_live = self.live[color], self.live[3 - color]
+        for k in CELL_WIN_PATTERNS[x][y]:
+            n = own[k]
+            own[k] = n + 1
+            if other[k] == 0:
+                own_live[n].discard(k)
+                own_live[n + 1].add(k)
+            elif n == 0:
+                # 对方的模式里第一次出现这一方的棋子，对方不可能再用它成五
+                other_live[other[k]].discard(k)
+    
+    def remove(self, x, y, color):
+        """撤销place的落子"""
+        self.board[x][y] = 0
+        own, other = self.counts[color], self.counts[3 - color]
+        own_live, other_live = self.live[color], self.live[3 - color]
+        for k in CELL_WIN_PATTERNS[x][y]:
+            n = own[k] - 1
+            own[k] = n
+            if other[k] == 0:
+                own_live[n + 1].discard(k)
+                if n:
+                    own_live[n].add(k)
+            elif n == 0:
+                other_live[other[k]].add(k)
+    
+    def empty_cells(self, k):
+        """返回第k个获胜模式中的空位"""
+        board = self.board
+        return [(x, y) for x, y in WIN_PATTERN_CELLS[k] if board[x][y] == 0]
+    
+    def open_cells(self, color, stones, patterns=None):
+        """
+        找出color方恰好有stones个棋子、对方没有棋子的获胜模式中的空位
+        
+        stones为4时得到的是再下一子就成五的位置，为3时得到的是能冲四的位置
+        
+        参数:
+            color: 棋子颜色
+            stones: 模式中color方的棋子数
+            patterns: 只检查这些获胜模式，为None时检查全部（直接取live集合）
+        
+        返回:
+            按位置排序、去重后的空位列表
+        """
+        if patterns is None:
+            cells = set()
+            for k in self.live[color][stones]:
+                cells.update(self.empty_cells(k))
+            return sorted(cells)
+        
+        own = self.counts[color]
+        other = self.counts[3 - color]
+        cells = set()
+        for k in patterns:
+            if own[k] == stones and other[k] == 0:
+                cells.update(self.empty_cells(k))
+        return sorted(cells)
+    
+    def four_cells_after(self, x, y, color):
+        """刚在(x,y)落下color方的棋子后，这一子形成的成五点"""
+        return self.open_cells(color, 4, CELL_WIN_PATTERNS[x][y])
+    
+    def is_three_move(self, x, y, color):
+        """
+        判断(x,y)上刚落下的棋子是否形成活三（下一步可以走成活四）
+        
+        活四就是同时有两个以上成五点的冲四，对方堵不住
+        """
+        for fx, fy in self.open_cells(color, 3, CELL_WIN_PATTERNS[x][y]):
+            self.place(fx, fy, color)
+            is_open_four = len(self.four_cells_after(fx, fy, color)) >= 2
+            self.remove(fx, fy, color)
+            if is_open_four:
+                return True
+        return False
+    
+    def count_node(self):
+        """节点计数，超过限制、被取消或超时（每16个节点检查一次）时抛出SearchTimeout"""
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            raise SearchTimeout()
+        if not self.nodes & 15:
+            if self.cancel is not None and self.cancel.is_set():
+                raise SearchTimeout()
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchTimeout()
+    
+    def vcf(self, color, depth):
+        """
+        VCF求解：轮到color方落子，只用冲四能否取胜
+        
+        参数:
+            color: 进攻方颜色
+            depth: 剩余可以冲四的步数
+        
+        返回:
+            进攻方取胜的落子序列（双方交替，第一个是进攻方的落子），不能取胜时返回None
+        """
+        self.count_node()
+        
+        # 自己已经有成五点，直接取胜
+        wins = self.open_cells(color, 4)
+        if wins:
+            return [wins[0]]
+        if depth <= 0:
+            return None
+        
+        # 对方有成五点时，必须一边堵住一边冲四；对方有两个成五点时已经输了
+        enemy = 3 - color
+        enemy_wins = self.open_cells(enemy, 4)
+        if len(enemy_wins) > 1:
+            return None
+        
+        for x, y in self.open_cells(color, 3):
+            if enemy_wins and (x, y) != enemy_wins[0]:
+                continue
+            line = self.try_four(x, y, color, lambda: self.vcf(color, depth - 1))
+            if line:
+                return line
+        return None
+    
+    def try_four(self, x, y, color, follow):
+        """
+        进攻方在(x,y)冲四，防守方堵住后调用follow继续进攻
+        
+        参数:
+            x, y: 冲四的位置
+            color: 进攻方颜色
+            follow: 防守方堵住之后继续求解的函数
+        
+        返回:
+            取胜的落子序列，不能取胜时返回None
+        """
+        self.place(x, y, color)
+        try:
+            wins = self.four_cells_after(x, y, color)
+            if len(wins) >= 2:
+                # 活四或双四：对方只能堵一个
+                return [(x, y), wins[0], wins[1]]
+            if len(wins) == 1:
+                block_x, block_y = wins[0]
+                self.place(block_x, block_y, 3 - color)
+                try:
+                    line = follow()
+                finally:
+                    self.remove(block_x, block_y, 3 - color)
+                if line:
+                    return [(x, y), (block_x, block_y)] + line
+            return None
+        finally:
+            self.remove(x, y, color)
+    
+    def vct(self, color, depth):
+        """
+        VCT求解：轮到color方落子，用冲四和活三能否取胜
+        
+        参数:
+            color: 进攻方颜色
+            depth: 剩余可以走活三的步数
+        
+        返回:
+            进攻方取胜的主要变化（第一个是进攻方的落子），不能取胜时返回None
+        """
+        # 先找VCF：只用冲四取胜最省节点
+        line = self.vcf(color, self.vcf_depth)
+        if line or depth <= 0:
+            return line
+        
+        # 对方有成五点时活三来不及，VCF已经试过冲四的应对
+        enemy = 3 - color
+        if self.open_cells(enemy, 4):
+            return None
+        
+        # 冲四之后继续VCT
+        for x, y in self.open_cells(color, 3):
+            line = self.try_four(x, y, color, lambda: self.vct(color, depth - 1))
+            if line:
+                return line
+        
+        # 活三：对方可以堵这条线上的空位，或者用冲四反击
+        # 同时连到多条二的位置（双三、三三）最可能取胜，先试
+        own, other = self.counts[color], self.counts[enemy]
+        def threat_count(cell):
+            return sum(1 for k in CELL_WIN_PATTERNS[cell[0]][cell[1]]
+                       if own[k] == 2 and other[k] == 0)
+        for x, y in sorted(self.open_cells(color, 2), key=threat_count, reverse=True):
+            self.place(x, y, color)
+            try:
+                if not self.is_three_move(x, y, color):
+                    continue
+                
+                defenses = set(self.open_cells(color, 3, CELL_WIN_PATTERNS[x][y]))
+                defenses.update(self.open_cells(enemy, 3))
+                line = None
+                for defense in sorted(defenses):
+                    self.place(defense[0], defense[1], enemy)
+                    try:
+                        reply = self.vct(color, depth - 1)
+                    finally:
+                        self.remove(defense[0], defense[1], enemy)
+                    if not reply:
+                        break
+                    # 只记录第一种应对的变化作为主要变化
+                    if line is None:
+                        line = [(x, y), defense] + reply
+                else:
+                    return line
+            finally:
+                self.remove(x, y, color)
+        return None
+    
+    def solve(self, board, color=2, cancel=None, time_budget_ms=None):
+        """
+        在给定局面上为color方寻找必胜的连续进攻，先试VCF再试VCT
+        
+        参数:
+            board: Judge.board格式的二维列表
+            color: 进攻方颜色（轮到这一方落子）
+            cancel: 取消标志（threading.Event），设置后尽快放弃求解，为None时不检查
+            time_budget_ms: 最多求解的时间（毫秒），为None时只按节点数限制
+        
+        返回:
+            必胜进攻的第一步(x, y)，没有找到（或节点数、时间用完、被取消）时返回None
+        """
+        start = time.perf_counter()
+        self.load(board)
+        self.nodes = 0
+        self.cancel = cancel
+        self.deadline = start + time_budget_ms / 1000 if time_budget_ms is not None else None
+        kind, line = None, None
+        try:
+            line = self.vcf(color, self.vcf_depth)
+            if line:
+                kind = "VCF"
+            else:
+                # VCT按活三步数逐步加深，短的必胜先找到
+                for depth in range(1, self.vct_depth + 1):
+                    line = self.vct(color, depth)
+                    if line:
+                        kind = "VCT"
+                        break
+        except SearchTimeout:
+            line = None
+        finally:
+            self.deadline = None
+        
+        self.stats = {
+            "nodes": self.nodes,
+            "time_ms": (time.perf_counter() - start) * 1000,
+            "kind": kind,
+            "line": line,
+        }
+        return line[0] if line else None
+
+class NumpyAI(AI):
+    """
+    使用NumPy向量化计算得分的AI
+    
+    获胜模式计数保存在NumPy数组中，"位置 → 获胜模式"的关系保存为0/1关联矩阵，
+    计算所有位置的得分只需要一次权重查表和一次矩阵-向量乘法。
+    选出的落子位置与AI.ai_run完全相同。
+    """
+    
+    # 关联矩阵：incidence[x * BOARD_SIZE + y][k] = 1 表示位置(x,y)属于第k个获胜模式
+    # pattern_ids[x][y] 是位置(x,y)的获胜模式编号数组，push_move用来批量更新
+    # 都由所有NumpyAI对象共享（只读），第一次创建对象时才构建
+    incidence = None
+    pattern_ids = None
+    
+    def __init__(self):
+        """初始化AI，需要安装NumPy"""
+        if np is None:
+            raise RuntimeError("NumpyAI需要安装NumPy")
+        
+        super().__init__()
+        
+        # 用NumPy数组保存获胜模式计数
+        self.ai_win_count = np.zeros(TOTAL_WIN_PATTERNS, dtype=np.int8)
+        self.human_win_count = np.zeros(TOTAL_WIN_PATTERNS, dtype=np.int8)
+        
+        if NumpyAI.incidence is None:
+            pattern_ids = []
+            for i in range(BOARD_SIZE):
+                row = []
+                for j in range(BOARD_SIZE):
+                    ids = np.array(self.win_patterns[i][j], dtype=np.intp)
+                    ids.flags.writeable = False
+                    row.append(ids)
+                pattern_ids.append(tuple(row))
+            NumpyAI.pattern_ids = tuple(pattern_ids)
+            
+            incidence = np.zeros((BOARD_SIZE * BOARD_SIZE, TOTAL_WIN_PATTERNS))
+            for i in range(BOARD_SIZE):
+                for j in range(BOARD_SIZE):
+                    incidence[i * BOARD_SIZE + j, list(self.win_patterns[i][j])] = 1
+            incidence.flags.writeable = False
+            NumpyAI.incidence = incidence
+        self.cell_pattern_ids = NumpyAI.pattern_ids
+    
+    def rebuild_scores(self):
+        """
+        根据得分权重重新生成查找表
+        
+        human_weight_table[c] 是某个获胜模式中玩家计数为c时的得分，
+        修改了human_score_weights或ai_score_weights之后需要调用一次
+        """
+        # 被对方堵住的模式计数为6，之后还可能再落4个己方棋子，所以计数最大为10
+        self.human_weight_table = np.array(
+            [self.human_score_weights.get(c, 0) for c in range(11)], dtype=np.float64)
+        self.ai_weight_table = np.array(
+            [self.ai_score_weights.get(c, 0) for c in range(11)], dtype=np.float64)
+    
+    def push_move(self, x, y, color):
+        """
+        落子：批量更新获胜模式计数，并把被改动的计数记到悔棋栈上
+        
+        参数:
+            x: 行坐标
+            y: 列坐标
+            color: 棋子颜色（1:玩家/黑棋，2:AI/白棋）
+        """
+        self.bitboard.place(x, y, color)
+        self.lines.place(x, y, color)
+        self.zobrist_hash ^= ZOBRIST_KEYS[color][x][y]
+        self.update_candidates(x, y, True)
+        
+        ids = self.cell_pattern_ids[x][y]
+        self.undo_stack.append((x, y, color, (self.human_win_count[ids].copy(),
+                                              self.ai_win_count[ids].copy())))
+        if color == 2:  # AI下棋（白棋）
+            self.ai_win_count[ids] += 1
+            self.human_win_count[ids] = 6
+        else:  # 玩家下棋（黑棋）
+            self.human_win_count[ids] += 1
+            self.ai_win_count[ids] = 6
+    
+    def pop_move(self):
+        """
+        撤销最后一次push_move
+        
+        返回:
+            (x, y, color): 被撤销的落子
+        """
+        x, y, color, (human_counts, ai_counts) = self.undo_stack.pop()
+        ids = self.cell_pattern_ids[x][y]
+        self.human_win_count[ids] = human_counts
+        self.ai_win_count[ids] = ai_counts
+        
+        self.bitboard.remove(x, y, color)
+        self.lines.remove(x, y, color)
+        self.zobrist_hash ^= ZOBRIST_KEYS[color][x][y]
+        self.update_candidates(x, y, False)
+        return x, y, color
+    
+    def ai_run(self, board):
+        """
+        AI主逻辑：选择最佳落子位置
+        
+        参数:
+            board: 当前棋盘状态
+        
+        返回:
+            (best_i, best_j): 最佳落子位置的行列坐标
+        """
+        # 只计算候选落子点：取出关联矩阵中对应的行
+        cells = self.candidate_cells()
+        if not cells:
+            return (0, 0)
+        incidence = self.incidence[[x * BOARD_SIZE + y for x, y in cells]]
+        
+        # 权重查表 + 矩阵-向量乘法，一次算出所有候选点的得分
+        human_scores = incidence @ self.human_weight_table[self.human_win_count]
+        ai_scores = incidence @ self.ai_weight_table[self.ai_win_count]
+        scores = self.evaluate_position(human_scores, ai_scores)
+        
+        # ai_run使用">="比较，得分相同时选择最后扫描到的位置，
+        # 所以在反转后的数组上找第一个最大值
+        best = scores.size - 1 - int(np.argmax(scores[::-1]))
+        return cells[best]
+
+# ==================== 批量评估 ====================
+# 离线分析棋谱时一次评估很多个局面：不依赖AI对象里随落子变化的计数，
+# 直接从棋盘数组算出每个获胜模式里双方的棋子数，再用矩阵乘法得到每个位置的得分
+
+# 一次处理的局面数。每个局面的中间结果约10KB（WIN_PATTERN_CELLS中实际的572个获胜模式
+# 的计数和得分；TOTAL_WIN_PATTERNS是按672个预留的上限，批量评估不使用），
+# 块太大时中间结果放不进CPU缓存，实测超过1024个局面后速度反而下降好几倍
+BATCH_CHUNK_SIZE = 512
+
+def iter_batch_evaluate(boards, colors=2, ai=None, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    分块批量评估局面，每处理完一块就产出这一块的结果
+    
+    打分规则和AI.ai_run相同：轮到谁下棋，谁的得分就按AI的权重和进攻权重计算，
+    最佳落子只在候选落子点中选择，得分相同时选行优先顺序里最后一个
+    
+    参数:
+        boards: 形状为 (N, BOARD_SIZE, BOARD_SIZE) 的数组，0=空，1=黑棋，2=白棋（第0行和第0列不使用）
+        colors: 每个局面轮到谁下棋，可以是一个数或者长度为N的数组，默认是AI（白棋）
+        ai: 使用这个AI对象的得分权重（只读取权重），为None时使用AI的默认权重
+        chunk_size: 每块的局面数
+    
+    返回:
+        生成器，依次产生 (start, scores, moves)：
+            start: 这一块第一个局面在boards中的下标
+            scores: 形状为 (块大小, BOARD_SIZE, BOARD_SIZE) 的综合得分，有棋子的位置为0
+            moves: 形状为 (块大小, 2) 的最佳落子，空棋盘为天元，棋盘下满时为(0, 0)
+    """
+    if np is None:
+        raise RuntimeError("批量评估需要安装NumPy")
+    # 只用到权重，不需要创建AI对象（创建时还要加载棋形表）
+    if ai is None:
+        human_weights, ai_weights = AI.HUMAN_SCORE_WEIGHTS, AI.AI_SCORE_WEIGHTS
+        offensive, defensive = AI.OFFENSIVE_WEIGHT, AI.DEFENSIVE_WEIGHT
+    else:
+        human_weights, ai_weights = ai.human_score_weights, ai.ai_score_weights
+        offensive, defensive = ai.offensive_weight, ai.defensive_weight
+    
+    boards = np.asarray(boards, dtype=np.uint8)
+    colors = np.broadcast_to(np.asarray(colors, dtype=np.uint8), boards.shape[:1])
+    cells = BOARD_SIZE * BOARD_SIZE
+    
+    # 每个获胜模式的5个位置在展平棋盘中的下标；关联矩阵的转置把模式得分加到位置上
+    pattern_index = np.array([[x * BOARD_SIZE + y for x, y in pattern]
+                              for pattern in WIN_PATTERN_CELLS], dtype=np.intp)
+    incidence = np.zeros((len(pattern_index), cells))
+    for k, pattern in enumerate(pattern_index):
+        incidence[k, pattern] = 1
+    
+    # 计数为c的模式的得分（c最大为5），有对方棋子的模式得分为0
+    own_table = np.array([ai_weights.get(c, 0) for c in range(6)], dtype=np.float64)
+    opp_table = np.array([human_weights.get(c, 0) for c in range(6)], dtype=np.float64)
+    
+    # 可落子的区域：第0行和第0列不使用
+    playable = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=bool)
+    playable[1:, 1:] = True
+    center = BOARD_SIZE // 2
+    
+    for start in range(0, len(boards), chunk_size):
+        chunk = boards[start:start + chunk_size]
+        own_color = colors[start:start + chunk_size, None, None]
+        size = len(chunk)
+        
+        own = (chunk == own_color).reshape(size, cells)
+        opp = ((chunk != 0) & (chunk != own_color)).reshape(size, cells)
+        own_counts = own[:, pattern_index].sum(axis=2)
+        opp_counts = opp[:, pattern_index].sum(axis=2)
+        
+        own_scores = np.where(opp_counts == 0, own_table[own_counts], 0) @ incidence
+        opp_scores = np.where(own_counts == 0, opp_table[opp_counts], 0) @ incidence
+        # 和AI.evaluate_position相同的加权
+        scores = (own_scores * offensive + opp_scores * defensive).reshape(
+            size, BOARD_SIZE, BOARD_SIZE)
+        
+        # 候选落子点：已有棋子周围CANDIDATE_DISTANCE格以内的空位（先横向再纵向扩展）
+        occupied = chunk != 0
+        near = occupied.copy()
+        for shift in range(1, CANDIDATE_DISTANCE + 1):
+            near[:, :, shift:] |= occupied[:, :, :-shift]
+            near[:, :, :-shift] |= occupied[:, :, shift:]
+        area = near.copy()
+        for shift in range(1, CANDIDATE_DISTANCE + 1):
+            area[:, shift:, :] |= near[:, :-shift, :]
+            area[:, :-shift, :] |= near[:, shift:, :]
+        candidates = area & ~occupied & playable
+        scores[~(playable & ~occupied)] = 0
+        
+        # 非候选点记为-1，在反转后的数组上找第一个最大值，即得分相同时最后扫描到的位置
+        masked = np.where(candidates, scores, -1).reshape(size, cells)
+        best = cells - 1 - np.argmax(masked[:, ::-1], axis=1)
+        moves = np.stack(np.divmod(best, BOARD_SIZE), axis=1)
+        moves[~candidates.reshape(size, cells).any(axis=1)] = 0
+        moves[~occupied.reshape(size, cells).any(axis=1)] = center
+        yield start, scores, moves
+
+def batch_evaluate(boards, colors=2, ai=None, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    批量评估局面，参数含义见iter_batch_evaluate
+    
+    局面非常多时结果本身也很大（每个局面约2KB），可以直接使用iter_batch_evaluate逐块处理
+    
+    返回:
+        (scores, moves): 所有局面的综合得分和最佳落子
+    """
+    boards = np.asarray(boards, dtype=np.uint8)
+    scores = np.zeros(boards.shape, dtype=np.float64)
+    moves = np.zeros((len(boards), 2), dtype=np.intp)
+    for start, chunk_scores, chunk_moves in iter_batch_evaluate(boards, colors, ai, chunk_size):
+        scores[start:start + len(chunk_scores)] = chunk_scores
+        moves[start:start + len(chunk_moves)] = chunk_moves
+    return scores, moves
+
+def analyze_games(log_paths, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    用批量评估分析自我对弈记录：每一步落子前的局面，单步打分AI会下在哪里
+    
+    参数:
+        log_paths: run_tournament输出的JSONL文件列表
+        chunk_size: 批量评估每块的局面数
+    """
+    if np is None:
+        print("批量分析需要安装NumPy")
+        return
+    
+    # 展开每局棋的所有局面：第i步落子前的棋盘、轮到谁下、实际下在哪里
+    played = []
+    for log_path in log_paths:
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                played.append(json.loads(line)["moves"])
+    count = sum(len(moves) for moves in played)
+    boards = np.zeros((count, BOARD_SIZE, BOARD_SIZE), dtype=np.uint8)
+    colors = np.zeros(count, dtype=np.uint8)
+    actual = np.zeros((count, 2), dtype=np.intp)
+    n = 0
+    for moves in played:
+        board = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=np.uint8)
+        for i, (x, y) in enumerate(moves):
+            color = 1 if i % 2 == 0 else 2
+            boards[n], colors[n], actual[n] = board, color, (x, y)
+            board[x, y] = color
+            n += 1
+    
+    start = time.perf_counter()
+    agree = 0
+    for first, _, moves in iter_batch_evaluate(boards, colors, chunk_size=chunk_size):
+        agree += int((moves == actual[first:first + len(moves)]).all(axis=1).sum())
+    elapsed = time.perf_counter() - start
+    
+    print(f"{len(played)}局 {count}个局面，耗时 {elapsed:.2f} 秒"
+          f"（每分钟 {count / elapsed * 60 if elapsed > 0 else 0:.0f} 个局面）")
+    print(f"实际落子与单步打分AI的选择相同的比例：{agree / count if count else 0:.1%}")
+
+# ==================== 无头模式 ====================
+# 没有显示器的机器（比如CI）上也要能测试界面的性能：用SDL的dummy视频驱动把窗口换成
+# 内存里的Surface，运行完整的main_loop，玩家的点击按脚本一步一步发到事件队列里
+
+def load_input_script(path):
+    """
+    读取无头模式的玩家落子脚本
+    
+    参数:
+        path: JSON文件，内容是玩家（黑棋）依次落子的位置 [[x, y], ...]；
+              也可以是自我对弈记录（JSONL），这时取第一局里黑棋的落子
+    
+    返回:
+        [(x, y), ...]
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # 多局的JSONL文件，只用第一局
+        data = json.loads(text.splitlines()[0])
+    if isinstance(data, dict):
+        data = data["moves"][0::2]
+    return [(x, y) for x, y in data]
+
+class HeadlessGame(GomokuGame):
+    """
+    无头模式的游戏
+    
+    轮到玩家时按脚本发出鼠标点击事件，记录从发出点击到棋子真正出现在窗口像素上的延迟；
+    一局结束（结果提示刷新到窗口上）或脚本用完时发出QUIT事件，main_loop正常退出
+    """
+    
+    def __init__(self, moves, *args, **kwargs):
+        """
+        参数:
+            moves: 玩家依次落子的位置 [(x, y), ...]
+            其余参数和GomokuGame相同
+        """
+        # 必须在pygame.init()之前设置
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        
+        self.script = list(moves)
+        self.next_move = 0
+        # 已经发出、还没显示出来的点击：(x, y, 发出的时间)
+        self.pending_click = None
+        # 每一步从发出点击到棋子显示出来的延迟（秒）
+        self.latencies = []
+        # 脚本里落在已有棋子上、只好跳过的位置
+        self.skipped_moves = []
+        self.result_shown = False
+        self.quitting = False
+        
+        super().__init__(*args, **kwargs)
+        self.renderer.frame_log = []
+    
+    def show_result(self, color):
+        """显示对局结果，并记下结果已经画出来了"""
+        super().show_result(color)
+        self.result_shown = True
+    
+    def after_frame(self):
+        """检查上一次点击的棋子是否已经显示出来，轮到玩家时发出下一次点击"""
+        if self.quitting:
+            return
+        
+        if self.pending_click is not None:
+            x, y, posted = self.pending_click
+            # 格子中心是黑色的网格线交点，取棋子内偏开网格线的一点判断棋子画出来没有
+            offset = self.renderer.stone_radius // 2
+            cx, cy = self.renderer.cell_rect(x, y).center
+            if self.window.get_at((cx + offset, cy + offset))[:3] != COLORS["black_stone"]:
+                return
+            self.latencies.append(time.perf_counter() - posted)
+            self.pending_click = None
+        
+        # 一局结束，等结果提示刷新到窗口上以后再退出
+        if self.judge.winner is not None:
+            if self.result_shown:
+                self.quit()
+            return
+        
+        if self.ai is None or self.ai_thinking or self.cur_color != 1:
+            return
+        
+        # 跳过已经有棋子的位置（脚本来自别的对局时，AI的应对可能不一样）
+        while self.next_move < len(self.script):
+            x, y = self.script[self.next_move]
+            self.next_move += 1
+            if self.judge.board[x][y] == 0:
+                gap = self.renderer.gap
+                self.pending_click = (x, y, time.perf_counter())
+                pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN,
+                                                     pos=(x * gap, y * gap), button=1))
+                return
+            self.skipped_moves.append((x, y))
+        
+        # 脚本用完了还没分出胜负
+        self.quit()
+    
+    def quit(self):
+        """发出QUIT事件，让main_loop退出"""
+        self.quitting = True
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+def summarize_times(times):
+    """
+    统计一组耗时
+    
+    参数:
+        times: 耗时列表（秒）
+    
+    返回:
+        {"count", "mean_ms", "median_ms", "p95_ms", "max_ms"}
+    """
+    if not times:
+        return {"count": 0, "mean_ms": 0.0, "median_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(times)
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "median_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+def run_headless(script_path, report_path=None, **game_options):
+    """
+    无头模式：按脚本下完一局，输出界面性能统计
+    
+    参数:
+        script_path: 玩家落子脚本（格式见load_input_script）
+        report_path: 统计结果另外写成JSON文件的路径，为None时不写
+        game_options: 传给GomokuGame的参数（ai_factory、threat_solver等）
+    
+    返回:
+        统计结果字典
+    """
+    moves = load_input_script(script_path)
+    start = time.perf_counter()
+    game = HeadlessGame(moves, **game_options)
+    try:
+        game.main_loop()
+    except SystemExit:
+        # main_loop收到QUIT事件时调用sys.exit()退出
+        pass
+    elapsed = time.perf_counter() - start
+    
+    report = {
+        "moves": len(game.judge.history),
+        "winner": game.judge.winner,
+        "skipped_moves": game.skipped_moves,
+        "wall_time_s": elapsed,
+        "startup_ms": {name: t * 1000 for name, t in game.startup_times.items()},
+        "frame": summarize_times(game.renderer.frame_log),
+        "latency": summarize_times(game.latencies),
+    }
+    
+    frame, latency = report["frame"], report["latency"]
+    winner = {None: "未分胜负", 0: "平局", 1: "玩家获胜", 2: "AI获胜"}[game.judge.winner]
+    print(f"无头模式：共 {report['moves']} 步，{winner}，"
+          f"跳过脚本里 {len(game.skipped_moves)} 个已有棋子的位置，总耗时 {elapsed:.2f} 秒")
+    print(f"每帧渲染：{frame['count']} 帧，平均 {frame['mean_ms']:.3f} ms，"
+          f"中位数 {frame['median_ms']:.3f} ms，P95 {frame['p95_ms']:.3f} ms，"
+          f"最长 {frame['max_ms']:.3f} ms")
+    print(f"点击到显示的延迟：{latency['count']} 步，平均 {latency['mean_ms']:.3f} ms，"
+          f"中位数 {latency['median_ms']:.3f} ms，P95 {latency['p95_ms']:.3f} ms，"
+          f"最长 {latency['max_ms']:.3f} ms")
+    
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+def play_benchmark_game(ai, rescore=False):
+    """
+    让AI自己和自己下完一整局棋，用于性能测试
+    
+    参数:
+        ai: AI对象（黑白双方都由它计算）
+        rescore: 为True时每一步都先调用rebuild_scores，模拟从头计算所有位置得分
+    
+    返回:
+        (moves, think_times, candidate_counts): 每一步的落子位置、每一步思考的耗时（秒），
+        以及每一步思考时的 (候选落子点数量, 空位数量)
+    """
+    judge = Judge()
+    moves, think_times, candidate_counts = [], [], []
+    color = 1
+    while not judge.is_full():
+        candidate_counts.append((len(ai.candidates), (BOARD_SIZE - 1) ** 2 - judge.stone_count))
+        start = time.perf_counter()
+        if rescore:
+            ai.rebuild_scores()
+        x, y = ai.ai_run(judge.board)
+        think_times.append(time.perf_counter() - start)
+        
+        judge.update_board(x, y, color)
+        ai.update_win_counts(x, y, color)
+        moves.append((x, y))
+        
+        # 有人获胜，这局结束
+        if judge.check_win(x, y):
+            break
+        color = 2 if color == 1 else 1
+    return moves, think_times, candidate_counts
+
+def benchmark(games):
+    """
+    比较不同计算方式下AI每一步的耗时
+    
+    - full:   纯Python，每一步从头计算所有位置的得分
+    - python: 纯Python，使用增量维护的得分表（游戏中使用的AI）
+    - numpy:  NumpyAI，权重查表 + 矩阵-向量乘法
+    
+    参数:
+        games: 每种方式下的完整对局数
+    """
+    backends = [("full", AI, True), ("python", AI, False)]
+    if np is not None:
+        backends.append(("numpy", NumpyAI, False))
+    else:
+        print("没有安装NumPy，只测试纯Python的AI")
+    
+    results = {}
+    for name, ai_class, rescore in backends:
+        all_moves, all_times, all_counts = [], [], []
+        for _ in range(games):
+            moves, think_times, candidate_counts = play_benchmark_game(ai_class(), rescore)
+            all_moves.append(moves)
+            all_times.extend(think_times)
+            all_counts.extend(candidate_counts)
+        per_move = sum(all_times) / len(all_times)
+        results[name] = (all_moves, per_move)
+        print(f"{name:>6}: {games}局 {len(all_times)}步，"
+              f"平均每步 {per_move * 1000:.3f} ms，最慢 {max(all_times) * 1000:.3f} ms")
+    
+    # 候选落子点占空位的比例（每种方式下的棋相同，只统计最后一种）
+    candidates = sum(count for count, _ in all_counts)
+    empties = sum(empty for _, empty in all_counts)
+    print(f"候选落子点：平均每步 {candidates / len(all_counts):.1f} 个，"
+          f"只占空位的 {candidates / empties:.1%}")
+    
+    # 所有方式都必须下出完全相同的棋
+    baseline_moves, baseline_time = results["full"]
+    for name, (moves, per_move) in results.items():
+        if name == "full":
+            continue
+        same = "一致" if moves == baseline_moves else "不一致！"
+        print(f"{name:>6}: 落子序列{same}，相对full加速比 {baseline_time / per_move:.2f}x")
+
+def table_stats(repeat=1000):
+    """
+    输出导入时构建的索引表的内存占用，以及创建各种AI对象的平均耗时
+    
+    参数:
+        repeat: 每种AI对象创建的次数
+    """
+    total = 0
+    for name, size in table_memory_report():
+        total += size
+        print(f"{name:>18}: {size / 1024:8.1f} KB")
+    print(f"{'合计':>16}: {total / 1024:8.1f} KB")
+    
+    ai_classes = [("AI", AI), ("ShapeAI", ShapeAI), ("SearchAI", SearchAI)]
+    if np is not None:
+        ai_classes.append(("NumpyAI", NumpyAI))
+    for name, ai_class in ai_classes:
+        # 第一次创建时会构建共享的得分表或矩阵，不计入平均耗时
+        ai_class()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            ai_class()
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f"{name:>18}: 创建一个对象平均 {elapsed * 1e6:.1f} µs")
+
+def benchmark_parallel(max_workers, depth=4):
+    """
+    测试并行搜索在不同工作进程数量下相对串行SearchAI的加速比
+    
+    测试局面取自一局AI自我对弈的第10、20、30步之后。基准是同样深度和节点数限制的
+    串行SearchAI，而不是1个进程的并行搜索：并行搜索比串行搜索多访问的节点也算进去
+    
+    参数:
+        max_workers: 最多测试到多少个工作进程
+        depth: 搜索深度
+    """
+    game_moves, _, _ = play_benchmark_game(AI())
+    positions = []
+    for n in (10, 20, 30):
+        black_bits = white_bits = 0
+        for step, (x, y) in enumerate(game_moves[:n]):
+            if step % 2 == 0:
+                black_bits |= 1 << BitBoard.bit_index(x, y)
+            else:
+                white_bits |= 1 << BitBoard.bit_index(x, y)
+        # 黑棋先手，下了n步之后轮到哪一方由n的奇偶决定
+        positions.append((black_bits, white_bits, 1 if n % 2 == 0 else 2))
+    
+    base_time, base_moves = 0, []
+    for black_bits, white_bits, color in positions:
+        ai = SearchAI(depth=depth)
+        ai.load_stones(black_bits, white_bits)
+        start = time.perf_counter()
+        base_moves.append(ai.ai_run(None, color))
+        base_time += time.perf_counter() - start
+    print(f"串行搜索: {base_time * 1000:.0f} ms")
+    
+    for workers in range(1, max_workers + 1):
+        # 进程池在计时之前启动好，只统计搜索本身的耗时
+        executor = start_search_pool(workers)
+        chosen, elapsed = [], 0
+        for black_bits, white_bits, color in positions:
+            ai = ParallelSearchAI(workers=workers, depth=depth, executor=executor)
+            ai.load_stones(black_bits, white_bits)
+            start = time.perf_counter()
+            chosen.append(ai.ai_run(None, color))
+            elapsed += time.perf_counter() - start
+        executor.shutdown()
+        
+        same = "一致" if chosen == base_moves else "和串行搜索不一致"
+        print(f"{workers:>2}个进程: {elapsed * 1000:.0f} ms，"
+              f"加速比 {base_time / elapsed:.2f}x，落子{same}")
+
+# ==================== 无界面自我对弈 ====================
+# 不打开窗口，直接用Judge和AI下棋，用多个进程同时下很多局，用来给AI调参
+
+def create_player(config):
+    """
+    按配置创建一个对弈用的AI
+    
+    参数:
+        config: 配置字典，可以包含 human_score_weights、ai_score_weights、
+                offensive_weight、defensive_weight（含义同AI.set_weights），
+                depth（大于0时使用该深度的SearchAI，否则使用单步打分的AI），
+                time_ms（每一步的思考时间，使用SearchAI或MCTSAI时有效；
+                只给出time_ms时SearchAI最多加深到8层），
+                mcts（为true时使用MCTSAI）和 playouts（MCTSAI每一步的模拟次数上限），
+                shapes（为true且不搜索时使用加上棋形得分的ShapeAI），
+                threat_nodes（大于0时落子前先用这个节点数限制的威胁空间搜索），
+                以及 book（开局库文件路径，落子前最先查询）
+    
+    返回:
+        AI对象（带有threat_solver和opening_book属性，不使用时为None）
+    """
+    depth = config.get("depth", 0)
+    time_ms = config.get("time_ms")
+    if config.get("mcts"):
+        ai = MCTSAI(playouts=config.get("playouts", 2000), time_budget_ms=time_ms)
+    elif depth > 0 or time_ms:
+        ai = SearchAI(depth=depth or 8, time_budget_ms=time_ms)
+    else:
+        ai = ShapeAI() if config.get("shapes") else AI()
+    
+    # JSON里字典的键是字符串，转换回连珠长度
+    weights = {}
+    for name in ("human_score_weights", "ai_score_weights"):
+        if name in config:
+            weights[name] = {int(k): v for k, v in config[name].items()}
+    ai.set_weights(offensive_weight=config.get("offensive_weight"),
+                   defensive_weight=config.get("defensive_weight"), **weights)
+    
+    threat_nodes = config.get("threat_nodes", 0)
+    ai.threat_solver = ThreatSolver(max_nodes=threat_nodes) if threat_nodes > 0 else None
+    ai.opening_book = OpeningBook(config["book"]) if config.get("book") else None
+    return ai
+
+def play_selfplay_game(game_index, players, seed, opening_moves):
+    """
+    下一局自我对弈（在工作进程里运行）
+    
+    AI总是把自己当成白棋（2），所以通知每个AI落子时要按它自己的视角转换颜色
+    
+    参数:
+        game_index: 对局序号，偶数局A执黑，奇数局B执黑
+        players: {"A": 配置, "B": 配置}
+        seed: 随机种子，和对局序号一起决定开局
+        opening_moves: 开局随机落子的步数（避免每局下得完全一样）
+    
+    返回:
+        对局结果字典（可以直接写成一行JSON）
+    """
+    rng = random.Random(seed * 1000003 + game_index)
+    names = ("A", "B") if game_index % 2 == 0 else ("B", "A")
+    ais = {1: create_player(players[names[0]]), 2: create_player(players[names[1]])}
+    judge = Judge()
+    
+    move_list, think_ms, candidate_counts = [], [], []
+    winner_color = 0
+    color = 1
+    for step in range((BOARD_SIZE - 1) ** 2):
+        start = time.perf_counter()
+        if step < opening_moves:
+            # 开局在中央区域随机落子
+            while True:
+                x = rng.randint(BOARD_SIZE // 2 - 3, BOARD_SIZE // 2 + 3)
+                y = rng.randint(BOARD_SIZE // 2 - 3, BOARD_SIZE // 2 + 3)
+                if judge.board[x][y] == 0:
+                    break
+        else:
+            ai = ais[color]
+            move = ai.opening_book.lookup(judge.board, color) if ai.opening_book else None
+            # 和GomokuGame.choose_ai_move一样，威胁空间搜索用掉的时间从AI的思考时间里扣除
+            budget = getattr(ai, "time_budget_ms", None)
+            if move is None and ai.threat_solver:
+                move = ai.threat_solver.solve(judge.board, color, None,
+                                              budget / 2 if budget is not None else None)
+                if budget is not None:
+                    budget -= ai.threat_solver.stats["time_ms"]
+            if move:
+                x, y = move
+            elif budget is not None:
+                x, y = ai.ai_run(judge.board, time_budget_ms=budget)
+            else:
+                x, y = ai.ai_run(judge.board)
+        think_ms.append(round((time.perf_counter() - start) * 1000, 3))
+        candidate_counts.append(len(ais[color].candidates))
+        
+        judge.update_board(x, y, color)
+        for ai_color, ai in ais.items():
+            ai.update_win_counts(x, y, 2 if color == ai_color else 1)
+        move_list.append((x, y))
+        
+        if judge.check_win(x, y):
+            winner_color = color
+            break
+        color = 2 if color == 1 else 1
+    
+    return {
+        "game": game_index,
+        "seed": seed,
+        "black": names[0],
+        "white": names[1],
+        "winner": names[winner_color - 1] if winner_color else None,
+        "winner_color": winner_color,
+        "length": len(move_list),
+        "moves": move_list,
+        "think_ms": think_ms,
+        "candidates": candidate_counts,
+    }
+
+def run_tournament(games, players, output, processes=None, seed=0, opening_moves=2):
+    """
+    用进程池下games局自我对弈，每下完一局就往JSONL文件里写一行结果
+    
+    参数:
+        games: 对局数
+        players: {"A": 配置, "B": 配置}，配置格式见create_player
+        output: 结果文件路径（JSONL格式，一局一行）
+        processes: 进程数量，为None时使用CPU核数
+        seed: 随机种子
+        opening_moves: 开局随机落子的步数
+    
+    返回:
+        {"A": A获胜局数, "B": B获胜局数, "draw": 平局数}
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    summary = {"A": 0, "B": 0, "draw": 0}
+    start = time.perf_counter()
+    with open(output, "w", encoding="utf-8") as f, \
+            ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(play_selfplay_game, i, players, seed, opening_moves)
+                   for i in range(games)]
+        # 哪一局先下完就先写哪一局
+        for future in as_completed(futures):
+            result = future.result()
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            summary[result["winner"] or "draw"] += 1
+    
+    elapsed = time.perf_counter() - start
+    print(f"{games}局，A胜 {summary['A']}，B胜 {summary['B']}，平局 {summary['draw']}，"
+          f"耗时 {elapsed:.1f} 秒（每分钟 {games / elapsed * 60:.0f} 局），结果写入 {output}")
+    return summary
+
+# ==================== 开局库 ====================
+# 开局的局面每局都差不多，提前从自我对弈记录里统计好"这个局面下哪一步胜率最高"，
+# AI查到就直接落子。棋盘的8种对称（旋转、翻转）是同一个局面，统一换算成
+# 哈希值最小的那种（规范局面）再查表，一条记录可以覆盖8个局面
+
+# 开局库文件，和程序放在同一个目录
+OPENING_BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+
+def symmetry_transform(x, y, symmetry):
+    """
+    对位置(x,y)做第symmetry种对称变换（0到7）
+    
+    第2位表示沿主对角线翻转，第1位表示上下翻转，第0位表示左右翻转，组合起来正好是8种对称
+    """
+    if symmetry & 4:
+        x, y = y, x
+    if symmetry & 2:
+        x = BOARD_SIZE - x
+    if symmetry & 1:
+        y = BOARD_SIZE - y
+    return x, y
+
+def symmetry_inverse(x, y, symmetry):
+    """symmetry_transform的逆变换"""
+    if symmetry & 1:
+        y = BOARD_SIZE - y
+    if symmetry & 2:
+        x = BOARD_SIZE - x
+    if symmetry & 4:
+        x, y = y, x
+    return x, y
+
+def canonical_key(stones, color):
+    """
+    计算局面的规范哈希值：8种对称局面的Zobrist哈希中最小的一个
+    
+    参数:
+        stones: [(x, y, 棋子颜色), ...]
+        color: 轮到谁下棋
+    
+    返回:
+        (key, symmetry): 规范哈希值，以及从原局面变换到规范局面所用的对称
+    """
+    best = None
+    for symmetry in range(8):
+        key = ZOBRIST_BLACK_TO_MOVE if color == 1 else 0
+        for x, y, stone in stones:
+            tx, ty = symmetry_transform(x, y, symmetry)
+            key ^= ZOBRIST_KEYS[stone][tx][ty]
+        if best is None or key < best[0]:
+            best = (key, symmetry)
+    return best
+
+class OpeningBook:
+    """
+    开局库：规范哈希值 → 推荐落子
+    
+    文件格式（小端序）：8字节文件头 MAGIC，4字节记录数，之后是按哈希值排好序的记录，
+    每条记录是 8字节哈希值 + 2字节落子位置（x * BOARD_SIZE + y，规范局面中的位置）
+    + 2字节统计局数。查找时用mmap映射文件再二分查找，不需要把整个文件读进内存；
+    第一次查找时才打开文件，不影响程序启动
+    """
+    
+    MAGIC = b"GMKBOOK1"
+    HEADER = struct.Struct("<8sI")
+    RECORD = struct.Struct("<QHH")
+    
+    def __init__(self, path=OPENING_BOOK_FILE, max_stones=12):
+        """
+        参数:
+            path: 开局库文件路径
+            max_stones: 棋盘上超过这么多棋子时不再查开局库
+        """
+        self.path = path
+        self.max_stones = max_stones
+        self.file = None
+        self.data = None
+        self.count = None  # None表示还没有打开文件
+        self.hits = 0
+        self.misses = 0
+    
+    def open(self):
+        """打开并映射开局库文件；文件不存在或格式不对时当作空开局库"""
+        self.count = 0
+        try:
+            self.file = open(self.path, "rb")
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # 文件不存在，或者是空文件（mmap不能映射长度为0的文件）
+            self.close()
+            self.count = 0
+            return
+        
+        if len(self.data) >= self.HEADER.size:
+            magic, count = self.HEADER.unpack_from(self.data, 0)
+            if magic == self.MAGIC and \
+                    len(self.data) >= self.HEADER.size + count * self.RECORD.size:
+                self.count = count
+    
+    def close(self):
+        """关闭开局库文件"""
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.count = None
+    
+    def find(self, key):
+        """
+        二分查找规范哈希值为key的记录
+        
+        返回:
+            (落子位置编码, 统计局数)，找不到时返回None
+        """
+        if self.count is None:
+            self.open()
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            record_key, move, games = self.RECORD.unpack_from(
+                self.data, self.HEADER.size + mid * self.RECORD.size)
+            if record_key == key:
+                return move, games
+            if record_key < key:
+                low = mid + 1
+            else:
+                high = mid
+        return None
+    
+    def lookup(self, board, color):
+        """
+        在开局库里查找当前局面的推荐落子
+        
+        参数:
+            board: Judge.board格式的二维列表
+            color: 轮到谁下棋
+        
+        返回:
+            推荐的落子位置(x, y)，不在开局库里时返回None
+        """
+        stones = [(x, y, board[x][y]) for x in range(1, BOARD_SIZE)
+                  for y in range(1, BOARD_SIZE) if board[x][y]]
+        if len(stones) > self.max_stones:
+            return None
+        
+        key, symmetry = canonical_key(stones, color)
+        record = self.find(key)
+        if record is not None:
+            x, y = symmetry_inverse(*divmod(record[0], BOARD_SIZE), symmetry)
+            if 0 < x < BOARD_SIZE and 0 < y < BOARD_SIZE and board[x][y] == 0:
+                self.hits += 1
+                return x, y
+        self.misses += 1
+        return None
+    
+    @classmethod
+    def build(cls, log_paths, path=OPENING_BOOK_FILE, max_plies=10, min_games=2):
+        """
+        从自我对弈记录（run_tournament输出的JSONL文件）生成开局库
+        
+        统计每个规范局面下每种落子的得分（胜1分，平0.5分），
+        选平均得分最高的落子；局数太少的局面不收录
+        
+        参数:
+            log_paths: 自我对弈记录文件路径列表
+            path: 输出的开局库文件路径
+            max_plies: 只统计每局的前max_plies步
+            min_games: 一种落子至少出现这么多局才收录
+        
+        返回:
+            收录的局面数
+        """
+        # 规范哈希值 → {规范局面中的落子: [得分, 局数]}
+        stats = {}
+        for log_path in log_paths:
+            with open(log_path, encoding="utf-8") as f:
+                for line in f:
+                    game = json.loads(line)
+                    stones = []
+                    for ply, (x, y) in enumerate(game["moves"][:max_plies]):
+                        color = 1 if ply % 2 == 0 else 2
+                        key, symmetry = canonical_key(stones, color)
+                        move = symmetry_transform(x, y, symmetry)
+                        if game["winner_color"] == color:
+                            score = 1.0
+                        elif game["winner_color"] == 0:
+                            score = 0.5
+                        else:
+                            score = 0.0
+                        entry = stats.setdefault(key, {}).setdefault(move, [0.0, 0])
+                        entry[0] += score
+                        entry[1] += 1
+                        stones.append((x, y, color))
+        
+        records = []
+        for key, moves in stats.items():
+            candidates = [(score / games, games, move)
+                          for move, (score, games) in moves.items() if games >= min_games]
+            if candidates:
+                _, games, (x, y) = max(candidates)
+                records.append((key, x * BOARD_SIZE + y, min(games, 0xFFFF)))
+        records.sort()
+        
+        with open(path, "wb") as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, len(records)))
+            for record in records:
+                f.write(cls.RECORD.pack(*record))
+        return len(records)
+
+def main():
+    """程序主入口函数"""
+    parser = argparse.ArgumentParser(description="五子棋人机对战")
+    parser.add_argument("--benchmark", type=int, metavar="GAMES",
+                        help="不打开窗口，用GAMES局AI自我对弈比较纯Python和NumPy的每步耗时")
+    parser.add_argument("--depth", type=int,
+                        help="使用alpha-beta搜索AI，并指定搜索深度")
+    parser.add_argument("--max-nodes", type=int, default=20000,
+                        help="搜索AI每一步最多访问的节点数（默认20000）")
+    parser.add_argument("--tt-size", type=int, default=1 << 16,
+                        help="搜索AI置换表的桶数量（默认65536）")
+    parser.add_argument("--time-ms", type=int,
+                        help="搜索AI每一步的思考时间（毫秒），按迭代加深搜索到时间用完")
+    parser.add_argument("--mcts", action="store_true",
+                        help="使用蒙特卡洛树搜索AI（可以配合--time-ms和--playouts）")
+    parser.add_argument("--playouts", type=int, default=2000,
+                        help="蒙特卡洛树搜索每一步最多模拟的次数（默认2000）")
+    parser.add_argument("--shapes", action="store_true",
+                        help="单步打分的AI加上棋形表得分（区分活三和眠三）")
+    parser.add_argument("--threat-nodes", type=int, default=3000,
+                        help="AI落子前威胁空间搜索（VCF/VCT）的节点数限制，0表示不使用（默认3000）")
+    parser.add_argument("--ponder", action="store_true",
+                        help="玩家思考时AI在后台预先计算玩家可能的应对，猜中时立即落子")
+    parser.add_argument("--book", default=OPENING_BOOK_FILE,
+                        help="开局库文件（默认程序目录下的opening_book.bin，不存在时不使用）")
+    parser.add_argument("--build-book", nargs="+", metavar="JSONL",
+                        help="不打开窗口，用自我对弈记录生成开局库（写入--book指定的文件）")
+    parser.add_argument("--book-plies", type=int, default=10,
+                        help="生成开局库时统计每局的前多少步（默认10）")
+    parser.add_argument("--workers", type=int,
+                        help="使用根节点并行的搜索AI，并指定工作进程数量")
+    parser.add_argument("--analyze", nargs="+", metavar="JSONL",
+                        help="不打开窗口，用NumPy批量评估自我对弈记录里的所有局面")
+    parser.add_argument("--headless", metavar="SCRIPT",
+                        help="不打开窗口，用SDL的dummy驱动按SCRIPT里玩家的落子运行完整的游戏主循环，"
+                             "输出每帧渲染耗时、点击到显示的延迟和总耗时（脚本格式见load_input_script）")
+    parser.add_argument("--report", metavar="JSON",
+                        help="无头模式的统计结果另外写成JSON文件")
+    parser.add_argument("--table-stats", action="store_true",
+                        help="不打开窗口，输出索引表的内存占用和创建AI对象的耗时")
+    parser.add_argument("--parallel-benchmark", type=int, metavar="MAX_WORKERS",
+                        help="不打开窗口，测试1到MAX_WORKERS个工作进程时并行搜索的加速比")
+    parser.add_argument("--tournament", type=int, metavar="GAMES",
+                        help="不打开窗口，用进程池下GAMES局AI自我对弈")
+    parser.add_argument("--players", metavar="JSON",
+                        help='自我对弈双方的配置文件，格式为 {"A": {...}, "B": {...}}')
+    parser.add_argument("--output", default="selfplay.jsonl",
+                        help="自我对弈结果文件（默认selfplay.jsonl）")
+    parser.add_argument("--processes", type=int, help="自我对弈的进程数量（默认CPU核数）")
+    parser.add_argument("--seed", type=int, default=0, help="自我对弈的随机种子")
+    parser.add_argument("--opening-moves", type=int, default=2,
+                        help="自我对弈开局随机落子的步数（默认2）")
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+    if args.analyze:
+        analyze_games(args.analyze)
+        return
+    if args.table_stats:
+        table_stats()
+        return
+    if args.parallel_benchmark:
+        benchmark_parallel(args.parallel_benchmark, depth=args.depth or 4)
+        return
+    if args.build_book:
+        count = OpeningBook.build(args.build_book, args.book, max_plies=args.book_plies)
+        print(f"开局库收录 {count} 个局面，写入 {args.book}")
+        return
+    if args.tournament:
+        players = {"A": {}, "B": {}}
+        if args.players:
+            with open(args.players, encoding="utf-8") as f:
+                players.update(json.load(f))
+        run_tournament(args.tournament, players, args.output, processes=args.processes,
+                       seed=args.seed, opening_moves=args.opening_moves)
+        return
+    
+    # 指定了搜索深度或思考时间时使用搜索AI，否则使用默认的单步打分AI
+    # 只指定思考时间时，最多加深到8层
+    ai_factory = None
+    if args.mcts:
+        ai_factory = partial(MCTSAI, playouts=args.playouts, time_budget_ms=args.time_ms)
+    elif args.workers:
+        # 所有对局共用一个常驻进程池，创建第一个AI时才启动
+        ai_factory = partial(create_parallel_ai, args.workers, depth=args.depth or 4,
+                             max_nodes=args.max_nodes)
+    elif args.depth or args.time_ms:
+        ai_factory = partial(SearchAI, depth=args.depth or 8, max_nodes=args.max_nodes,
+                             tt_size=args.tt_size, time_budget_ms=args.time_ms)
+    elif args.shapes:
+        ai_factory = ShapeAI
+    
+    # 创建游戏对象
+    threat_solver = ThreatSolver(max_nodes=args.threat_nodes) if args.threat_nodes > 0 else None
+    opening_book = OpeningBook(args.book) if args.book else None
+    if args.headless:
+        run_headless(args.headless, args.report, ai_factory=ai_factory,
+                     threat_solver=threat_solver, opening_book=opening_book, ponder=args.ponder)
+        return
+    game = GomokuGame(ai_factory, threat_solver, opening_book, ponder=args.ponder)
     
     # 开始游戏主循环
     game.main_loop()
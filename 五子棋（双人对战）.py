@@ -1,8 +1,10 @@
+import time
+
+# 程序开始运行的时间点，用来统计第一帧显示出来用了多久（包括导入pygame的时间）
+START_TIME = time.perf_counter()
+
 import pygame
 import sys
-import time
-import threading
-from tkinter import Tk, messagebox
 
 # 窗口大小（像素）
 WINDOW_SIZE = 736
@@ -33,15 +35,11 @@ COLORS = {
     "white_stone": (255, 255, 255), # 白棋颜色
 }
 
-# 注意：实际项目中应尽量避免使用全局变量，这里为了简化而使用
-# 线程锁：用于多线程同步，防止多个线程同时访问共享资源
-lock = threading.Lock()
-
-# 弹窗状态：标记是否已经弹出获胜提示窗口
-show_popup_window = False
+# 一局结束时发出的事件，event.winner 是获胜方颜色（1或2），平局为0
+GAME_OVER_EVENT = pygame.USEREVENT + 1
 
-# 获胜者：记录游戏获胜方（玩家或AI）
-winner = None
+# 对局结果提示使用的字体（按顺序找第一个系统里有的，都没有时用pygame的默认字体）
+RESULT_FONT = "SimHei,Microsoft YaHei,PingFang SC,Noto Sans CJK SC,WenQuanYi Micro Hei"
 
 class GomokuGame:
     """游戏主类，负责游戏流程控制和界面显示"""
@@ -59,21 +57,47 @@ class GomokuGame:
         
         # 当前回合的棋子颜色，1=黑棋（玩家先手），2=白棋（AI）
         self.cur_color = 1
+        
+        # 这一帧需要刷新到屏幕的矩形（落子只刷新棋子所在的格子）；为None时刷新整个窗口
+        self.dirty_rects = None
+        # 主循环每次醒来时刷新了画面还是跳过了刷新，退出时输出
+        self.frame_stats = {"rendered": 0, "skipped": 0}
+        
+        # 鼠标移动和游戏无关，屏蔽后移动鼠标不会唤醒主循环
+        pygame.event.set_blocked(pygame.MOUSEMOTION)
 
         self.draw_board() # 绘制初始棋盘
+        
+        # 把空棋盘显示出来，输出启动耗时
+        pygame.display.update()
+        self.dirty_rects = []
+        print(f"启动耗时：第一帧 {(time.perf_counter() - START_TIME) * 1000:.0f} ms")
 
     def main_loop(self):
         """游戏主循环，不断处理事件和更新画面"""
         while True:  # 无限循环，直到游戏退出
-            # 获取所有发生的事件（鼠标点击、窗口关闭等）
-            for event in pygame.event.get():
+            # 没有事件时阻塞在这里，不占用CPU；醒来后把积压的事件一起取出
+            events = [pygame.event.wait()] + pygame.event.get()
+            
+            # 处理所有发生的事件（鼠标点击、窗口关闭等）
+            for event in events:
                 # 如果事件是关闭窗口（点击右上角的X）
                 if event.type == pygame.QUIT:
+                    print(f"画面刷新 {self.frame_stats['rendered']} 次，"
+                          f"没有变化跳过 {self.frame_stats['skipped']} 次")
                     pygame.quit()  # 关闭Pygame
                     sys.exit()     # 退出程序
                 
-                # 如果事件是鼠标按钮按下（玩家点击落子）
-                elif event.type == pygame.MOUSEBUTTONDOWN:
+                # 一局结束，在窗口里显示结果
+                elif event.type == GAME_OVER_EVENT:
+                    self.show_result(event.winner)
+                
+                # 窗口被遮挡后重新露出，需要重新刷新
+                elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self.dirty_rects = None
+                
+                # 如果事件是鼠标按钮按下（玩家点击落子），一局结束后不响应
+                elif event.type == pygame.MOUSEBUTTONDOWN and self.judge.winner is None:
                     # 获取鼠标点击的像素坐标
                     x, y = event.pos
                     
@@ -83,8 +107,17 @@ class GomokuGame:
                     # 处理玩家落子
                     self.make_move(grid_x, grid_y)
             
-            # 更新整个游戏窗口的显示
-            pygame.display.update()
+            # 画面有变化时才更新窗口的显示
+            if self.dirty_rects is None or self.dirty_rects:
+                # 重画过棋盘时刷新整个窗口，否则只刷新落子改动的矩形
+                if self.dirty_rects is None:
+                    pygame.display.update()
+                else:
+                    pygame.display.update(self.dirty_rects)
+                self.dirty_rects = []
+                self.frame_stats["rendered"] += 1
+            else:
+                self.frame_stats["skipped"] += 1
     
     def make_move(self, grid_x, grid_y):
         """
@@ -108,6 +141,10 @@ class GomokuGame:
                 # 更新棋盘状态，并检查是否获胜
                 self.judge.update_board(grid_x, grid_y, self.cur_color)
                 
+                # 分出胜负或者下满了，通过事件通知主循环显示结果
+                if self.judge.winner is not None:
+                    pygame.event.post(pygame.event.Event(GAME_OVER_EVENT, winner=self.judge.winner))
+                
                 # 切换当前回合：黑棋变白棋，白棋变黑棋
                 self.cur_color = 2 if self.cur_color == 1 else 1
                 
@@ -115,6 +152,28 @@ class GomokuGame:
         
         return False  # 落子失败
 
+    def show_result(self, color):
+        """
+        在窗口中间画一块半透明的提示框显示对局结果（收到GAME_OVER_EVENT时调用）
+        
+        参数:
+            color: 获胜方颜色，1=黑棋，2=白棋，0=平局
+        """
+        if color:
+            msg = f"{'玩家 (黑色)' if color == 1 else 'AI (白色)'} 获胜!"
+        else:
+            msg = "平局！"
+        pygame.display.set_caption(f"五子棋双人对战 - {msg}")
+        
+        text = pygame.font.SysFont(RESULT_FONT, 32).render(msg, True, COLORS["white_stone"])
+        banner = pygame.Surface((text.get_width() + GAP, text.get_height() + GAP), pygame.SRCALPHA)
+        banner.fill((0, 0, 0, 160))
+        banner.blit(text, (GAP // 2, GAP // 2))
+        rect = banner.get_rect(center=self.window.get_rect().center)
+        self.window.blit(banner, rect)
+        if self.dirty_rects is not None:
+            self.dirty_rects.append(rect)
+    
     def place_stone(self, grid_x, grid_y, color):
         """
         在棋盘上绘制一个棋子
@@ -127,7 +186,9 @@ class GomokuGame:
         # 根据颜色选择棋子颜色
         stone_color = COLORS["black_stone"] if color == 1 else COLORS["white_stone"]
         # 绘制圆形棋子
-        pygame.draw.circle(self.window, stone_color, (grid_x * GAP, grid_y * GAP), STONE_SIZE)
+        rect = pygame.draw.circle(self.window, stone_color, (grid_x * GAP, grid_y * GAP), STONE_SIZE)
+        if self.dirty_rects is not None:
+            self.dirty_rects.append(rect)
     
     def compute_grid_position(self, x, y):
         """
@@ -152,6 +213,8 @@ class GomokuGame:
     
     def draw_board(self):
         """绘制棋盘背景、网格线和星位点"""
+        self.dirty_rects = None
+        
         # 填充背景颜色
         self.window.fill(COLORS["background"])
         
@@ -190,6 +253,12 @@ class Judge:
         # 棋盘大小：BOARD_SIZE × BOARD_SIZE（第1行和第一列没有使用）
         # 0 = 空，1 = 黑棋（玩家），2 = 白棋（AI）
         self.board = [[0 for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+        
+        # 棋盘上的棋子数，判断棋盘是否下满时不用再扫描棋盘
+        self.stone_count = 0
+        
+        # 对局结果：None=还没结束，0=平局，1或2=获胜方颜色
+        self.winner = None
     
     def update_board(self, x, y, color):
         """
@@ -209,20 +278,15 @@ class Judge:
         if self.board[x][y] == 0:
             # 在棋盘上放置棋子
             self.board[x][y] = color
+            self.stone_count += 1
             
-            # 检查是否获胜（五子连珠）
+            # 检查是否获胜（五子连珠），记录获胜方的颜色
             if self.check_win(x, y):
-                # 使用全局变量记录获胜信息
-                global show_popup_window, winner
-                with lock: # 加锁，确保线程安全
-                    show_popup_window = True # 设置弹窗标志
-
-                    # 确定获胜者：1=玩家，2=AI
-                    winner = "玩家 (黑色)" if color == 1 else "AI (白色)"
+                self.winner = color
 
             # 检查是否平局（棋盘满了）
-            if self.is_full():
-                show_popup_window = True
+            elif self.is_full():
+                self.winner = 0
 
             # 返回更新成功
             return True
@@ -283,82 +347,14 @@ class Judge:
             True: 棋盘已满，平局
             False: 棋盘还有空位
         """
-        # 遍历棋盘的每一行
-        for row in self.board:
-            # 检查这一行是否还有空位（0表示空位）
-            if 0 in row:
-                return False  # 发现空位，棋盘未满
-        
-        # 所有位置都非空，棋盘已满
-        return True
-
-class PopupWindow(Tk):
-    """弹窗类，用于显示游戏结果提示"""
-    
-    def __init__(self):
-        """初始化弹窗窗口"""
-        # 调用父类Tk的初始化方法
-        super().__init__()
-        # 隐藏主窗口，我们只需要消息框
-        self.wm_withdraw()
-    
-    def show_message(self, msg):
-        """
-        显示消息框
-        
-        参数:
-            msg: 要显示的消息内容
-        """
-        # 使用tkinter的messagebox显示提示信息
-        # "提示！！！"是窗口标题，msg是具体内容
-        messagebox.showinfo("提示！！！", msg)
-
-
-def show_winner_popup():
-    """
-    显示获胜弹窗的线程函数
-    
-    这个函数在一个单独的线程中运行，定期检查是否需要显示获胜提示。
-    使用多线程可以避免弹窗阻塞游戏主循环。
-    """
-    # 声明使用全局变量
-    global show_popup_window, winner
-    
-    # 无限循环，持续检查是否需要显示弹窗
-    while True:
-        # 使用线程锁，确保安全访问全局变量
-        with lock:
-            # 检查是否需要显示弹窗
-            if show_popup_window:
-                # 创建弹窗对象
-                popup = PopupWindow()
-                
-                # 根据获胜者显示不同的消息
-                if winner:  # winner不为None，表示有获胜者
-                    popup.show_message(f"{winner} 获胜!")
-                else:       # winner为None，表示平局
-                    popup.show_message("平局！")
-                
-                # 重置弹窗标志，避免重复显示
-                show_popup_window = False
-                
-                # 退出循环（弹窗已经显示）
-                break
-        
-        # 暂停0.5秒再检查，避免过度占用CPU
-        time.sleep(0.5)
+        # 可落子的位置共有(BOARD_SIZE - 1)²个（第0行和第0列不使用，所以不能数棋盘里的0）
+        return self.stone_count >= (BOARD_SIZE - 1) ** 2
 
 def main():
     """程序主入口函数"""
     # 创建游戏对象
     game = GomokuGame()
     
-    # 创建并启动弹窗线程
-    # target: 线程要执行的函数
-    # daemon=True: 设置为守护线程，主程序退出时自动结束
-    popup_thread = threading.Thread(target=show_winner_popup, daemon=True)
-    popup_thread.start()  # 启动线程
-    
     # 开始游戏主循环
     game.main_loop()
 
@@ -1,7 +1,8 @@
+import time
+START_TIME = time.perf_counter()  # 程序开始运行的时间点，用来统计第一帧的耗时
 import pygame
 import socket
 import queue
-import time
 import sys
 import struct
 import threading
@@ -12,6 +13,9 @@ WINDOW_SIZE = 736
 BOARD_SIZE = 16
 STONE_SIZE = 15
 CONNECTED_TIME = 6 * 3
+WAKE_EVENT = pygame.USEREVENT + 1  # 消息队列里有新消息时发出，唤醒阻塞等待的主循环
+AI_PONDER = False  # 玩家思考时本地AI是否预先计算玩家可能的应对（和单机版的--ponder一样默认关闭）
+PONDER_REPLIES = 6  # 每次最多预判的玩家应对数
 TOTAL_WIN_PATTERNS = 4 * (BOARD_SIZE - 4) * (BOARD_SIZE - 2)
 GAP = WINDOW_SIZE // BOARD_SIZE
 POINTS = [(2, 2), (2, 12), (7, 7), (12, 2), (12, 12)]
@@ -22,6 +26,31 @@ COLORS = {
     "white_stone": (255, 255, 255), # 白棋颜色
 }
 
+def add_win_pattern(cell_patterns, pattern_id, start_i, start_j, di, dj):
+    for k in range(5):
+        cell_patterns[start_i + k * di][start_j + k * dj].append(pattern_id)
+
+def init_win_patterns():
+    # cell_patterns[x][y] 是包含位置(x,y)的获胜模式编号列表（最多20个）
+    cell_patterns = [[[] for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+    pattern_id = 0
+    # 横向和纵向的所有赢法
+    for i in range(1, BOARD_SIZE):
+        for j in range(1, BOARD_SIZE - 4):
+            add_win_pattern(cell_patterns, pattern_id, i, j, 0, 1)
+            add_win_pattern(cell_patterns, pattern_id + 1, j, i, 1, 0)
+            pattern_id += 2
+    # 对角线方向的所有赢法
+    for i in range(1, BOARD_SIZE - 4):
+        for j in range(1, BOARD_SIZE - 4):
+            add_win_pattern(cell_patterns, pattern_id, i, j, 1, 1)
+            add_win_pattern(cell_patterns, pattern_id + 1, i, BOARD_SIZE - j, 1, -1)
+            pattern_id += 2
+    return cell_patterns
+
+# 导入时构建一次，转换成元组后所有AI对象只读共享，切换到本地AI对战时不再重新构建
+CELL_WIN_PATTERNS = tuple(tuple(tuple(ids) for ids in row) for row in init_win_patterns())
+
 # 服务器IP和端口
 SERVER_IP = '8.156.83.41'
 SERVER_PORT = 6666
@@ -50,12 +79,19 @@ class TCPClient:
     """TCP客户端类，负责网络通信"""
     
     def __init__(self, game_callback, timeout_callback):
-        """初始化TCP客户端并连接服务器"""
+        """初始化TCP客户端（调用start后才连接服务器）"""
         self.game_callback = game_callback  # 游戏回调函数
         self.timeout_callback = timeout_callback
         self.connected = False
         self.is_matched = False
         self.start_time = time.time()
+        self.socket = None
+
+    def start(self):
+        # 连接服务器可能要等很久，放到后台线程里，窗口先显示出来
+        threading.Thread(target=self.connect, daemon=True).start()
+
+    def connect(self):
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)  # 创建TCP套接字
             self.socket.connect((SERVER_IP, SERVER_PORT))          # 连接服务器
@@ -68,6 +104,9 @@ class TCPClient:
             threading.Thread(target=self.check_time, daemon=True).start() # 启动超时检查线程
         except Exception as e:
             print(f"连接服务器失败：{e}")
+            if self.socket:
+                self.socket.close()
+                self.socket = None
             self.timeout_callback()
 
     def disconnect(self):
@@ -157,13 +196,10 @@ class AI:
 
     def __init__(self):
         """初始化AI"""
-        self.win_patterns = [[[False for _ in range(TOTAL_WIN_PATTERNS)] 
-                     for _ in range(BOARD_SIZE)] 
-                     for _ in range(BOARD_SIZE)]
-        self.ai_win_count = [0 for _ in range(TOTAL_WIN_PATTERNS)]
-        self.human_win_count = [0 for _ in range(TOTAL_WIN_PATTERNS)]
+        self.win_patterns = CELL_WIN_PATTERNS
+        self.ai_win_count = [0] * TOTAL_WIN_PATTERNS
+        self.human_win_count = [0] * TOTAL_WIN_PATTERNS
 
-        self.win_pattern_count = 0
         self.human_score_weights = {
             1: 200,    # 单独一子
             2: 400,    # 两子连珠
@@ -176,45 +212,43 @@ class AI:
             3: 2100,
             4: 20000,  # 四子连珠得分远高于玩家
         }
-        self.init_win_patterns()
+        # 上一次ai_run的耗时（毫秒）
+        self.last_time_ms = 0
     
-    def add_win_pattern(self, start_i, start_j, di, dj):
-        for k in range(5):
-            self.win_patterns[start_i + k * di][start_j + k * dj][self.win_pattern_count] = True
-        self.win_pattern_count += 1
-
-    def init_win_patterns(self):
-        # 横向和纵向的所有赢法
+    def copy(self):
+        # 复制获胜模式计数，预判时在副本上试走，不影响这一局的AI
+        ai = AI()
+        ai.ai_win_count = self.ai_win_count[:]
+        ai.human_win_count = self.human_win_count[:]
+        return ai
+
+    def likely_replies(self, board, count):
+        # 站在玩家的角度给空位打分（玩家的得分算进攻），返回最可能的count个应对
+        scored = []
         for i in range(1, BOARD_SIZE):
-            for j in range(1, BOARD_SIZE - 4):
-                # 水平方向的获胜模式
-                self.add_win_pattern(i, j, 0, 1)
-                # 垂直方向的获胜模式
-                self.add_win_pattern(j, i, 1, 0)
-        
-        # 对角线方向的所有赢法
-        for i in range(1, BOARD_SIZE - 4):
-            for j in range(1, BOARD_SIZE - 4):
-                # 右下对角线获胜模式
-                self.add_win_pattern(i, j, 1, 1)
-                # 左下对角线获胜模式
-                self.add_win_pattern(i, BOARD_SIZE - j, 1, -1)
-    
+            for j in range(1, BOARD_SIZE):
+                if board[i][j] == 0:
+                    human = sum(self.human_score_weights.get(self.human_win_count[k], 0)
+                                for k in self.win_patterns[i][j])
+                    ai = sum(self.ai_score_weights.get(self.ai_win_count[k], 0)
+                             for k in self.win_patterns[i][j])
+                    scored.append((self.evaluate_position(ai, human), (i, j)))
+        scored.sort(reverse=True)
+        return [cell for _, cell in scored[:count]]
+
     def update_win_counts(self, x, y, color):
-        # 遍历所有获胜模式
-        for k in range(TOTAL_WIN_PATTERNS):
-            # 检查这个位置是否属于第k个获胜模式
-            if self.win_patterns[x][y][k]:
-                if color == StoneColor.WHITE:  # AI下棋（白棋）
-                    # AI在这个获胜模式中增加一子
-                    self.ai_win_count[k] += 1
-                    # 玩家在这个模式中不可能获胜了（设置为异常值6，超过5）
-                    self.human_win_count[k] = 6
-                else:  # 玩家下棋（黑棋）
-                    # 玩家在这个获胜模式中增加一子
-                    self.human_win_count[k] += 1
-                    # AI在这个模式中不可能获胜了
-                    self.ai_win_count[k] = 6
+        # 只遍历包含这个位置的获胜模式
+        for k in self.win_patterns[x][y]:
+            if color == StoneColor.WHITE:  # AI下棋（白棋）
+                # AI在这个获胜模式中增加一子
+                self.ai_win_count[k] += 1
+                # 玩家在这个模式中不可能获胜了（设置为异常值6，超过5）
+                self.human_win_count[k] = 6
+            else:  # 玩家下棋（黑棋）
+                # 玩家在这个获胜模式中增加一子
+                self.human_win_count[k] += 1
+                # AI在这个模式中不可能获胜了
+                self.ai_win_count[k] = 6
 
     def evaluate_position(self, human_score, ai_score):
         OFFENSIVE_WEIGHT = 1.2  # 进攻权重：鼓励AI积极进攻
@@ -223,6 +257,7 @@ class AI:
         return ai_score * OFFENSIVE_WEIGHT + human_score * DEFENSIVE_WEIGHT
 
     def ai_run(self, board):
+        start = time.perf_counter()
         # 初始化最佳位置和最佳得分
         best_pos = (0, 0)  # 最佳位置（默认左上角）
         best_score = -1    # 最佳得分（初始为-1）
@@ -235,16 +270,14 @@ class AI:
                     # 重置当前位置i,j得分
                     cur_human_score, cur_ai_score = 0, 0
                     
-                    # 遍历所有获胜模式，计算这个位置的得分
-                    for k in range(TOTAL_WIN_PATTERNS):
-                        # 如果这个位置属于第k个获胜模式
-                        if self.win_patterns[i][j][k]:
-                            # 累加玩家在这个模式下的得分
-                            cur_human_score += self.human_score_weights.get(
-                                self.human_win_count[k], 0)
-                            # 累加AI在这个模式下的得分
-                            cur_ai_score += self.ai_score_weights.get(
-                                self.ai_win_count[k], 0)
+                    # 遍历这个位置所属的获胜模式，计算这个位置的得分
+                    for k in self.win_patterns[i][j]:
+                        # 累加玩家在这个模式下的得分
+                        cur_human_score += self.human_score_weights.get(
+                            self.human_win_count[k], 0)
+                        # 累加AI在这个模式下的得分
+                        cur_ai_score += self.ai_score_weights.get(
+                            self.ai_win_count[k], 0)
                     
                     # 计算综合得分
                     cur_score = self.evaluate_position(cur_human_score, cur_ai_score)
@@ -254,6 +287,7 @@ class AI:
                         best_score = cur_score
                         best_pos = (i, j)
         
+        self.last_time_ms = (time.perf_counter() - start) * 1000
         # 返回最佳落子位置
         return best_pos
 
@@ -264,10 +298,13 @@ class GomokuGame:
         pygame.init()  # 初始化Pygame所有模块
         self.window = pygame.display.set_mode((WINDOW_SIZE, WINDOW_SIZE))
         self.msg_queue = queue.Queue()
-        self.msg_queue.put(("MSG", "五子棋双人对战")) # 设置窗口标题
-        # 字体初始化
-        self.font = pygame.font.SysFont("SimHei", 24) # 使用黑体
-        self.msg_queue.put(("MSG", "正在连接服务器..."))
+        # 画面有变化时才刷新：dirty_rects是落子改动的矩形，为None时刷新整个窗口
+        # frame_stats记录主循环醒来时刷新和跳过的次数
+        self.dirty_rects = None
+        self.frame_stats = {"rendered": 0, "skipped": 0}
+        pygame.event.set_blocked(pygame.MOUSEMOTION)  # 鼠标移动不唤醒主循环
+        self.post_msg(("MSG", "五子棋双人对战")) # 设置窗口标题
+        self.post_msg(("MSG", "正在连接服务器..."))
         # 当前回合的棋子颜色，1=黑棋（玩家先手），2=白棋（AI）
         self.my_color = StoneColor.BLACK # 玩家棋子颜色
         self.competitor_color = StoneColor.WHITE  # 对手棋子颜色
@@ -276,11 +313,22 @@ class GomokuGame:
 
         self.ai = None
         self.judge = None
+        # 对局编号：切换到本地AI对战时加1，AI线程送回的旧对局结果直接丢弃
+        self.game_id = 0
+        # 预判：按玩家应对后的局面保存AI的回应，键是棋盘内容
+        self.ponder_thread = None
+        self.ponder_cancel = None
+        self.ponder_cache = {}
 
         self.draw_board() # 绘制初始棋盘
+        pygame.display.update()  # 连接服务器之前先把空棋盘显示出来
+        self.dirty_rects = []
+        print(f"第一帧 {(time.perf_counter() - START_TIME) * 1000:.0f} ms")
         try:
             self.game_mode = GameMode.NETWORK
+            # 先赋值再连接：连接失败时后台线程会调用switch_to_ai断开self.tcp
             self.tcp = TCPClient(self.tcp_callback, self.switch_to_ai)
+            self.tcp.start()
         except Exception as e:
             print(f"切换为本地 AI 对战:{e}")
             self.switch_to_ai()
@@ -296,14 +344,22 @@ class GomokuGame:
         except Exception as e:
             print({e})
 
+        self.game_id += 1
+        self.stop_pondering()
+        self.ponder_cache.clear()
         self.game_mode = GameMode.LOCAL_AI
         self.my_turn = True  # 玩家先手
         self.my_color = StoneColor.BLACK  # 玩家执黑
         self.competitor_color = StoneColor.WHITE # AI 执白
         
-        self.msg_queue.put(("MSG", "本地AI对战 - 你执黑先手"))
+        self.post_msg(("MSG", "本地AI对战 - 你执黑先手"))
         print(f"switch to ai {self.game_mode}")
 
+    def post_msg(self, msg):
+        # 网络线程和AI线程都通过这里发消息，同时发出WAKE_EVENT唤醒阻塞等待的主循环
+        self.msg_queue.put(msg)
+        pygame.event.post(pygame.event.Event(WAKE_EVENT))
+
     def set_title(self, msg):
         """设置窗口标题"""
         pygame.display.set_caption(msg)
@@ -313,37 +369,38 @@ class GomokuGame:
         global player_id
         if cmd == Cmd.MSG_ASSIGN_ID:
             player_id = p_id
-            self.msg_queue.put(("MSG", f"已连接(ID:{player_id})，等待匹配对手..."))
+            self.post_msg(("MSG", f"已连接(ID:{player_id})，等待匹配对手..."))
             print(f"分配玩家 ID: {player_id}")
         elif cmd == Cmd.MSG_GAME_START:
             self.tcp.is_matched = True
             print("游戏开始：", "你执黑先手" if x == 1 else "你执白后手")
             color_name = "黑棋(先手)" if x == 1 else "白棋(后手)"
-            self.msg_queue.put(("MSG", f"匹配成功！你执{color_name}"))
+            self.post_msg(("MSG", f"匹配成功！你执{color_name}"))
             self.my_color = x  # 游戏开始，玩家执黑先手
             self.competitor_color = y  # 对手颜色
             if self.my_color == StoneColor.BLACK:
-                self.msg_queue.put(("MSG", "轮到你下棋..."))
+                self.post_msg(("MSG", "轮到你下棋..."))
                 self.my_turn = True
         elif cmd == Cmd.MSG_MAKE_MOVE:
             print(f"对手落子: ({x}, {y})")
-            self.msg_queue.put(("MOVE", x, y, self.competitor_color))
+            self.post_msg(("MOVE", x, y, self.competitor_color))
             # 轮到玩家下棋
             self.my_turn = True
-            self.msg_queue.put(("MSG", "轮到你下棋..."))
+            self.post_msg(("MSG", "轮到你下棋..."))
         elif cmd == Cmd.MSG_GAME_END:
             if x == 1:
-                self.msg_queue.put(("MSG", "您赢了！！！"))
+                self.post_msg(("MSG", "您赢了！！！"))
             else:
-                self.msg_queue.put(("MSG", "您输了！！！"))
+                self.post_msg(("MSG", "您输了！！！"))
             self.my_turn = False
         elif cmd == Cmd.MSG_GAME_DISCONNECT:
-            self.msg_queue.put(("MSG", "对手掉线了"))
+            self.post_msg(("MSG", "对手掉线了"))
 
     def main_loop(self):
         """游戏主循环，不断处理事件和更新画面"""
         while True:  # 无限循环，直到游戏退出
-            pygame.time.Clock().tick(60)  # 控制帧率为60FPS
+            # 没有事件时阻塞等待，不占用CPU；醒来后把积压的事件一起取出
+            events = [pygame.event.wait()] + pygame.event.get()
             # 处理消息队列中的消息
             while not self.msg_queue.empty():
                 msg = self.msg_queue.get()
@@ -352,13 +409,27 @@ class GomokuGame:
                 elif msg[0] == "MOVE":
                     x, y, color = msg[1], msg[2], msg[3]
                     self.make_move(x, y, color)
-
-            # 获取所有发生的事件（鼠标点击、窗口关闭等）
-            for event in pygame.event.get():
+                elif msg[0] == "AI_MOVE":
+                    # AI线程算好的落子，对局编号不一致说明是旧对局的结果
+                    game_id, x, y = msg[1], msg[2], msg[3]
+                    if game_id == self.game_id:
+                        self.make_move(x, y, self.competitor_color)
+                        if not self.game_over:
+                            self.my_turn = True
+                            self.set_title("轮到你下棋...")
+                            self.start_pondering()
+
+            # 处理所有发生的事件（鼠标点击、窗口关闭等）
+            for event in events:
                 # 如果事件是关闭窗口（点击右上角的X）
                 if event.type == pygame.QUIT:
+                    print(f"画面刷新 {self.frame_stats['rendered']} 次，"
+                          f"没有变化跳过 {self.frame_stats['skipped']} 次")
                     pygame.quit()  # 关闭Pygame
                     sys.exit()     # 退出程序
+                # 窗口被遮挡后重新露出，需要重新刷新
+                elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self.dirty_rects = None
                 
                 # 如果事件是鼠标按钮按下（玩家点击落子）
                 elif event.type == pygame.MOUSEBUTTONDOWN:
@@ -369,8 +440,17 @@ class GomokuGame:
                         grid_x, grid_y = self.compute_grid_position(x, y)
                         self.make_move(grid_x, grid_y, self.my_color)
             
-            # 更新整个游戏窗口的显示
-            pygame.display.update()
+            # 画面有变化时才更新窗口的显示
+            if self.dirty_rects is None or self.dirty_rects:
+                # 重画过棋盘时刷新整个窗口，否则只刷新落子改动的矩形
+                if self.dirty_rects is None:
+                    pygame.display.update()
+                else:
+                    pygame.display.update(self.dirty_rects)
+                self.dirty_rects = []
+                self.frame_stats["rendered"] += 1
+            else:
+                self.frame_stats["skipped"] += 1
 
     def make_move(self, grid_x, grid_y, color):
         if self.game_over:
@@ -384,7 +464,7 @@ class GomokuGame:
             self.tcp.send_msg(Cmd.MSG_MAKE_MOVE, grid_x, grid_y)  # 向服务器发送落子消息
             if color == self.my_color:
                 self.my_turn = False
-                self.msg_queue.put(("MSG", f"对方回合，等待对手落子..."))
+                self.post_msg(("MSG", f"对方回合，等待对手落子..."))
             return True
         else:
             # 更新棋盘状态，并检查是否获胜
@@ -393,28 +473,77 @@ class GomokuGame:
             if winner:
                 self.game_over = True  # 锁定游戏状态
                 msg = "白方获胜" if winner == StoneColor.WHITE else "黑方获胜"
-                self.msg_queue.put(("MSG", msg))
+                self.post_msg(("MSG", msg))
                 self.my_turn = False
                 return True
             if color == self.my_color:
                 self.my_turn = False
-                # 开启一个微延迟或者直接调用 AI
+                self.post_msg(("MSG", "AI思考中..."))
+                # AI在工作线程里思考，主循环继续刷新画面
                 self.handle_ai_turn()
-                if not self.game_over:                    
-                    self.msg_queue.put(("MSG", "轮到你下棋..."))
+            return True
 
     def handle_ai_turn(self):
-        # AI计算最佳落子位置
-        ai_x, ai_y = self.ai.ai_run(self.judge.board)
-        # 处理AI落子
-        self.make_move(ai_x, ai_y, self.competitor_color)
-        self.my_turn = True
+        # 预判过这个局面时直接落子，否则启动AI线程
+        self.stop_pondering()
+        cached = self.ponder_cache.get(self.board_key(self.judge.board))
+        if cached is not None:
+            print(f"AI预判命中: {cached}")
+            self.post_msg(("AI_MOVE", self.game_id, cached[0], cached[1]))
+            return
+        threading.Thread(target=self.ai_worker,
+                         args=(self.game_id, self.ai, self.judge.board),
+                         daemon=True).start()
+
+    def ai_worker(self, game_id, ai, board):
+        # AI在工作线程里计算最佳落子位置，结果通过消息队列交给主线程落子
+        ai_x, ai_y = ai.ai_run(board)
+        print(f"AI思考: 耗时 {ai.last_time_ms:.1f} ms")
+        self.post_msg(("AI_MOVE", game_id, ai_x, ai_y))
+
+    @staticmethod
+    def board_key(board):
+        return tuple(tuple(row) for row in board)
+
+    def start_pondering(self):
+        # 轮到玩家时在后台预判，只用棋盘和AI的副本
+        if not AI_PONDER or self.game_mode != GameMode.LOCAL_AI:
+            return
+        self.ponder_cancel = threading.Event()
+        board = [row[:] for row in self.judge.board]
+        self.ponder_thread = threading.Thread(
+            target=self.ponder_worker,
+            args=(self.ai.copy(), board, self.ponder_cancel), daemon=True)
+        self.ponder_thread.start()
+
+    def ponder_worker(self, ai, board, cancel):
+        for x, y in ai.likely_replies(board, PONDER_REPLIES):
+            if cancel.is_set():
+                break
+            reply_ai = ai.copy()
+            reply_ai.update_win_counts(x, y, self.my_color)
+            board[x][y] = self.my_color
+            key = self.board_key(board)
+            if key not in self.ponder_cache:
+                move = reply_ai.ai_run(board)
+                # 被取消时结果可能不完整，不放进缓存
+                if not cancel.is_set():
+                    self.ponder_cache[key] = move
+            board[x][y] = 0
+
+    def stop_pondering(self):
+        if self.ponder_thread is None:
+            return
+        self.ponder_cancel.set()
+        self.ponder_thread.join()
+        self.ponder_thread = None
 
     def place_stone(self, grid_x, grid_y, color):
         # 根据颜色选择棋子颜色
         stone_color = COLORS["black_stone"] if color == StoneColor.BLACK else COLORS["white_stone"]
-        pygame.draw.circle(self.window, stone_color, (grid_x * GAP, grid_y * GAP), STONE_SIZE)
-        pygame.display.update()
+        rect = pygame.draw.circle(self.window, stone_color, (grid_x * GAP, grid_y * GAP), STONE_SIZE)
+        if self.dirty_rects is not None:
+            self.dirty_rects.append(rect)
     
     def compute_grid_position(self, x, y):
         grid_x = round(x / GAP)
@@ -427,6 +556,7 @@ class GomokuGame:
         return grid_x, grid_y
     
     def draw_board(self):
+        self.dirty_rects = None
         self.window.fill(COLORS["background"])
         
         for i in range(BOARD_SIZE):
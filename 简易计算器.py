@@ -1,5 +1,4 @@
 import tkinter as tk
-from tkinter import messagebox
 from functools import partial
 from decimal import Decimal, DivisionByZero, InvalidOperation
 from typing import List, Union
@@ -333,6 +332,8 @@ def main():
         calculator = CalculatorView("标准计算器")
         calculator.run()
     except Exception:
+        # 只有启动失败时才用到消息框，这时再导入
+        from tkinter import messagebox
         messagebox.showerror("Error", "Failed to start calculator")
 
 